@@ -0,0 +1,304 @@
+"""
+Offline benchmarks for the fuzzy_search module.
+
+    python -m fuzzy_search.benchmark lookup [--sizes 1000 10000 100000] [--queries 300]
+    python -m fuzzy_search.benchmark memory [--triggers 100000]
+    python -m fuzzy_search.benchmark normalize [--samples 20000]
+    python -m fuzzy_search.benchmark courtesy [--phrases 50 500 5000]
+"""
+import argparse
+import gc
+import json
+import random
+import re
+import tempfile
+import time
+import tracemalloc
+import unicodedata
+from array import array
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Tuple
+
+import numpy as np
+
+from . import fuzzy_search as fs
+from .fuzzy_search import BASE_DIR, GENERAL_QA, path_general
+from .courtesy import CourtesyStripper
+from .normalize_text import COURTESY_RE, norm_text, _norm_text
+
+
+#------------------------ Synthetic knowledge bases ------------------------#
+def load_seed_kb(path: str = path_general) -> List[Tuple[List[str], str]]:
+    """ (triggers, answer) pairs of the real knowledge base, used as seed for the synthetic ones """
+    with open(BASE_DIR / path, "r", encoding="utf-8") as f:
+        obj = json.load(f)
+    return [(it.get('triggers', []), it.get('answer', '')) for lst in obj.values() if isinstance(lst, list) for it in lst]
+
+
+def synthetic_kb(n_triggers: int, triggers_per_answer: int = 20, seed: int = 0) -> Dict[str, list]:
+    """
+    KB in the general_QA.json format with n_triggers triggers: the real knowledge base
+    plus filler entries built from its vocabulary.
+    """
+    rng = random.Random(seed)
+    seed_kb = load_seed_kb()
+    vocab = sorted({w for trigs, _ in seed_kb for t in trigs for w in norm_text(t, False).split()})
+    answers = [ans for _, ans in seed_kb]
+
+    knowledge = [{"triggers": trigs, "answer": ans} for trigs, ans in seed_kb]
+    n_filler = max(0, n_triggers - sum(len(trigs) for trigs, _ in seed_kb))
+    for i in range(0, n_filler, triggers_per_answer):
+        trigs = [" ".join(rng.choices(vocab, k=rng.randint(2, 6))) for _ in range(min(triggers_per_answer, n_filler - i))]
+        knowledge.append({"triggers": trigs, "answer": f"{rng.choice(answers)} ({i // triggers_per_answer})"})
+    return {"knowledge": knowledge}
+
+
+#------------------------ Noisy STT-like queries ------------------------#
+COURTESY_PREFIXES = ["oye ", "oye robot ", "hola ", "por favor ", "disculpa ", "oiga ", "me podrias decir "]
+
+
+def strip_accents(s: str) -> str:
+    return "".join(c for c in unicodedata.normalize("NFD", s) if not unicodedata.combining(c))
+
+
+def asr_noise(text: str, rng: random.Random) -> str:
+    """ Perturb a trigger the way a transcript does: dropped accents, merged words, courtesy prefixes, typos """
+    if rng.random() < 0.7:
+        text = strip_accents(text)
+    words = text.split()
+    if len(words) > 1 and rng.random() < 0.3:
+        i = rng.randrange(len(words) - 1)
+        words[i:i + 2] = [words[i] + words[i + 1]]
+    text = " ".join(words)
+    if rng.random() < 0.4:
+        text = rng.choice(COURTESY_PREFIXES) + text
+    if text and rng.random() < 0.3:
+        i = rng.randrange(len(text))
+        text = text[:i] + text[i + 1:]
+    if rng.random() < 0.3:
+        text = text.capitalize() + "?"
+    return text
+
+
+def noisy_queries(n_queries: int, seed: int = 1) -> List[Tuple[str, str]]:
+    """ (query, expected answer) pairs from the real knowledge base triggers """
+    rng = random.Random(seed)
+    pairs = [(t, ans) for trigs, ans in load_seed_kb() for t in trigs]
+    return [(asr_noise(t, rng), ans) for t, ans in (rng.choice(pairs) for _ in range(n_queries))]
+
+
+def kb_pairs(kb: Dict[str, list]) -> List[Tuple[str, str]]:
+    return [(norm_text(t, False), it['answer']) for lst in kb.values() for it in lst for t in it['triggers']]
+
+
+#------------------------ Memory ------------------------#
+def dict_layout(pairs: List[Tuple[str, str]]):
+    """ Previous GENERAL_QA layout: one {'q', 'a'} dict per trigger """
+    return [{'q': q, 'a': a} for q, a in pairs]
+
+
+def compact_layout(pairs: List[Tuple[str, str]]):
+    """ Current GENERAL_QA layout: trigger list, distinct answers and an array('I') of answer ids """
+    triggers: List[str] = []
+    answer_ids = array('I')
+    answer_table: Dict[str, int] = {}
+    for q, a in pairs:
+        triggers.append(q)
+        answer_ids.append(answer_table.setdefault(a, len(answer_table)))
+    return triggers, list(answer_table), answer_ids
+
+
+def measure(build: Callable, *args) -> int:
+    """ Bytes still allocated by the structure returned by build(*args) """
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build(*args)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return after - before
+
+
+def bench_memory(n_triggers: int) -> None:
+    pairs = kb_pairs(synthetic_kb(n_triggers))
+    old = measure(dict_layout, pairs)
+    new = measure(compact_layout, pairs)
+    print(f"Synthetic KB: {len(pairs)} triggers, {len({a for _, a in pairs})} distinct answers")
+    print(f"  dict per trigger : {old / 1e6:8.2f} MB")
+    print(f"  compact (array)  : {new / 1e6:8.2f} MB  ({old / max(new, 1):.1f}x smaller)")
+
+
+#------------------------ Lookup latency / accuracy ------------------------#
+BACKENDS = {
+    # name -> module settings overridden while the backend is measured
+    "rapidfuzz": {"use_rapidfuzz": True, "use_ngram_index": False},
+    "rapidfuzz+ngram": {"use_rapidfuzz": True, "use_ngram_index": True},
+    "difflib": {"use_rapidfuzz": False, "use_ngram_index": False},
+}
+
+
+@contextmanager
+def settings(**overrides) -> Iterator[None]:
+    """ Temporarily override the fuzzy_search module settings (they're read at call time) """
+    previous = {name: getattr(fs, name) for name in overrides}
+    for name, value in overrides.items():
+        setattr(fs, name, value)
+    try:
+        yield
+    finally:
+        for name, value in previous.items():
+            setattr(fs, name, value)
+
+
+def bench_backend(kb_path: str, queries: List[Tuple[str, str]]) -> Dict[str, float]:
+    """ Load the KB and run every query once, returns latency percentiles, throughput, peak memory and accuracy """
+    gc.collect()
+    tracemalloc.start()
+    app = GENERAL_QA(kb_path)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    latencies = np.empty(len(queries))
+    correct = 0
+    for i, (query, expected) in enumerate(queries):
+        start = time.perf_counter()
+        res = app.lookup(query)
+        latencies[i] = time.perf_counter() - start
+        correct += res.get("answer") == expected
+
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000.0
+    return {
+        "p50_ms": p50, "p95_ms": p95, "p99_ms": p99,
+        "qps": len(queries) / latencies.sum(),
+        "peak_mb": peak / 1e6,
+        "top1": correct / len(queries),
+    }
+
+
+def bench_lookup(sizes: List[int], n_queries: int, slow_queries: int, backends: List[str]) -> None:
+    queries = noisy_queries(n_queries)
+    print(f"{'triggers':>9} {'backend':<16} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'q/s':>9} {'peak MB':>8} {'top-1':>6}")
+    with tempfile.TemporaryDirectory() as tmp, settings(cache_size=0, use_snapshot=False):
+        for size in sizes:
+            kb_path = str(Path(tmp) / f"kb_{size}.json")
+            with open(kb_path, "w", encoding="utf-8") as f:
+                json.dump(synthetic_kb(size), f, ensure_ascii=False)
+            for name in backends:
+                # SequenceMatcher is pure Python, keep its run short on large KBs
+                n = n_queries if BACKENDS[name]["use_rapidfuzz"] else min(n_queries, slow_queries)
+                with settings(**BACKENDS[name]):
+                    r = bench_backend(kb_path, queries[:n])
+                print(f"{size:>9} {name:<16} {r['p50_ms']:>8.3f} {r['p95_ms']:>8.3f} {r['p99_ms']:>8.3f} "
+                      f"{r['qps']:>9.1f} {r['peak_mb']:>8.1f} {r['top1']:>6.1%}")
+
+
+#------------------------ Normalization ------------------------#
+def reference_norm_text(s: str, courtesy_flag: bool) -> str:
+    """ Original norm_text (NFD + ascii encode/decode and three regex passes), the fast one must match it exactly """
+    s = unicodedata.normalize('NFD', s).encode('ascii', 'ignore').decode("ascii")
+    s = re.sub(r'[^a-z0-9 ]+',' ', s.lower())
+    if courtesy_flag:
+        s = COURTESY_RE.sub(' ', s)
+    return re.sub(r'\s+',' ', s).strip()
+
+
+def random_unicode_texts(n: int, seed: int = 2) -> List[str]:
+    """ Random strings mixing accented Spanish, courtesy phrases, punctuation, whitespace and arbitrary code points """
+    rng = random.Random(seed)
+    words = [t for trigs, _ in load_seed_kb() for t in trigs] + [p.strip() for p in COURTESY_PREFIXES]
+    alphabet = list("abcdefghijklmnopqrstuvwxyzáéíóúüñÁÉÍÓÚÑ0123456789 ¿?¡!.,;:-\t\n")
+    texts = []
+    for _ in range(n):
+        parts = []
+        for _ in range(rng.randint(0, 6)):
+            r = rng.random()
+            if r < 0.4:
+                parts.append(rng.choice(words))
+            elif r < 0.8:
+                parts.append("".join(rng.choices(alphabet, k=rng.randint(1, 8))))
+            else:
+                parts.append("".join(chr(rng.randrange(0x30000)) for _ in range(rng.randint(1, 4))))
+        texts.append(rng.choice([" ", "  ", ", ", ""]).join(parts))
+    return texts
+
+
+def bench_normalize(samples: int) -> None:
+    seed_kb = load_seed_kb()
+    kb_texts = [t for trigs, _ in seed_kb for t in trigs] + [ans for _, ans in seed_kb]
+    texts = kb_texts + random_unicode_texts(samples)
+
+    # Micro-benchmark (equality with the reference is asserted by tests/test_normalize_text.py): reference vs fast path (without memo) vs memoized repeated queries
+    queries = [q for q, _ in noisy_queries(2000)]
+    for label, fn, data in [
+        ("reference", reference_norm_text, texts),
+        ("translate", _norm_text, texts),
+        ("reference (queries)", reference_norm_text, queries),
+        ("memoized (queries)", norm_text, queries),
+    ]:
+        for flag in (False, True):
+            start = time.perf_counter()
+            for t in data:
+                fn(t, flag)
+            elapsed = time.perf_counter() - start
+            print(f"  {label:<20} courtesy={flag!s:<5} {elapsed / len(data) * 1e6:8.2f} us/string")
+
+
+#------------------------ Courtesy stripping ------------------------#
+def courtesy_regex(phrases: List[str]) -> "re.Pattern[str]":
+    """ Single alternation in the style of COURTESY_RE, longest phrases first so it strips the same as the trie """
+    alternation = "|".join(r"\s+".join(map(re.escape, p.split())) for p in sorted(phrases, key=len, reverse=True))
+    return re.compile(rf"(?<!\w)(?:{alternation})(?!\w)")
+
+
+def bench_courtesy(sizes: List[int], n_queries: int = 2000, seed: int = 3) -> None:
+    rng = random.Random(seed)
+    vocab = ["".join(rng.choices("abcdefghijklmnopqrstuvwxyz", k=rng.randint(2, 8))) for _ in range(3000)]
+    for size in sizes:
+        phrases = sorted({" ".join(rng.choices(vocab, k=rng.randint(1, 4))) for _ in range(size)})
+        regex = courtesy_regex(phrases)
+        trie = CourtesyStripper(phrases)
+        queries = []
+        for _ in range(n_queries):
+            words = rng.choices(vocab, k=rng.randint(4, 12))
+            words.insert(rng.randrange(len(words) + 1), rng.choice(phrases))
+            queries.append(" ".join(words))
+
+        start = time.perf_counter()
+        by_regex = [" ".join(regex.sub(" ", q).split()) for q in queries]
+        t_regex = time.perf_counter() - start
+        start = time.perf_counter()
+        by_trie = [trie.strip(q) for q in queries]
+        t_trie = time.perf_counter() - start
+
+        same = sum(a == b for a, b in zip(by_regex, by_trie))
+        print(f"{len(phrases):>6} phrases: regex {t_regex / n_queries * 1e6:9.2f} us/query | "
+              f"trie {t_trie / n_queries * 1e6:7.2f} us/query | {t_regex / t_trie:6.1f}x | same output {same}/{n_queries}")
+
+
+#------------------------ CLI ------------------------#
+if "__main__" == __name__:
+    parser = argparse.ArgumentParser(description="fuzzy_search benchmarks")
+    sub = parser.add_subparsers(dest="bench", required=True)
+    p_lookup = sub.add_parser("lookup", help="Lookup latency, throughput, memory and top-1 accuracy per backend")
+    p_lookup.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    p_lookup.add_argument("--queries", type=int, default=300)
+    p_lookup.add_argument("--slow-queries", type=int, default=10, help="Max queries for the difflib backend")
+    p_lookup.add_argument("--backends", nargs="+", choices=list(BACKENDS), default=list(BACKENDS))
+    p_mem = sub.add_parser("memory", help="Memory of the old dict layout vs the compact layout")
+    p_mem.add_argument("--triggers", type=int, default=100_000)
+    p_norm = sub.add_parser("normalize", help="Time norm_text against the reference implementation")
+    p_norm.add_argument("--samples", type=int, default=20_000)
+    p_court = sub.add_parser("courtesy", help="Courtesy stripping: alternation regex vs token trie")
+    p_court.add_argument("--phrases", type=int, nargs="+", default=[50, 500, 5_000])
+    args = parser.parse_args()
+
+    if args.bench == "lookup":
+        bench_lookup(args.sizes, args.queries, args.slow_queries, args.backends)
+    elif args.bench == "memory":
+        bench_memory(args.triggers)
+    elif args.bench == "normalize":
+        bench_normalize(args.samples)
+    elif args.bench == "courtesy":
+        bench_courtesy(args.phrases)
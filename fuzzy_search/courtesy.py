@@ -0,0 +1,79 @@
+import json
+from typing import Any, Dict, Iterable, List
+
+END = "" # Marks the end of a phrase in the trie, tokens are never empty
+
+
+class CourtesyStripper:
+    """
+    Removes courtesy phrases (por favor, gracias, etc) from normalized text.
+
+    The phrases are compiled into a token-level trie, so stripping is one left-to-right
+    scan of the query: at each token the trie is walked as far as it matches and the
+    longest phrase found is dropped. The cost depends on the query length and the
+    longest phrase, not on how many phrases there are.
+    """
+
+    def __init__(self, phrases: Iterable[str]):
+        self.root: Dict[str, Any] = {}
+        self.size = 0
+        for phrase in phrases:
+            self.add(phrase)
+
+    @classmethod
+    def from_file(cls, path: str, normalize) -> "CourtesyStripper":
+        """ Load phrases from a JSON list, or a dict of lists (groups), normalizing them with `normalize` """
+        with open(path, "r", encoding="utf-8") as f:
+            obj = json.load(f)
+        groups = obj.values() if isinstance(obj, dict) else [obj]
+        return cls(normalize(p) for lst in groups if isinstance(lst, list) for p in lst if isinstance(p, str))
+
+    def add(self, phrase: str) -> None:
+        """ Add an already normalized phrase """
+        tokens = phrase.split()
+        if not tokens:
+            return
+        node = self.root
+        for tok in tokens:
+            node = node.setdefault(tok, {})
+        if END not in node:
+            node[END] = True
+            self.size += 1
+
+    def __len__(self) -> int:
+        return self.size
+
+    def phrases(self) -> List[str]:
+        """ Every phrase in the trie, sorted """
+        out: List[str] = []
+        stack = [(self.root, [])]
+        while stack:
+            node, tokens = stack.pop()
+            for tok, child in node.items():
+                if tok == END:
+                    out.append(" ".join(tokens))
+                else:
+                    stack.append((child, tokens + [tok]))
+        return sorted(out)
+
+    def strip(self, s: str) -> str:
+        """ Remove every courtesy phrase of s (leftmost, longest match first), returns the remaining tokens joined by spaces """
+        tokens = s.split()
+        n = len(tokens)
+        out: List[str] = []
+        i = 0
+        while i < n:
+            node, j, end = self.root, i, -1
+            while j < n:
+                node = node.get(tokens[j])
+                if node is None:
+                    break
+                j += 1
+                if END in node:
+                    end = j
+            if end > 0:
+                i = end
+            else:
+                out.append(tokens[i])
+                i += 1
+        return " ".join(out)
@@ -1,9 +1,18 @@
 import json
 import logging
+import os
+import threading
+from array import array
 from typing import List, Dict, Any
 from difflib import SequenceMatcher
+import numpy as np
 from rapidfuzz import fuzz as rf_fuzz
+from rapidfuzz import process as rf_process
 from .normalize_text import norm_text
+from .ngram_index import NgramIndex
+from .snapshot import Snapshot, read_snapshot, write_snapshot
+from .query_cache import QueryCache
+from utils.metrics import METRICS
 
 # Configuration
 from pathlib import Path
@@ -19,65 +28,390 @@ with SETTINGS.open("r", encoding="utf-8") as f:
 fuzzy_logic_accuracy_general = cfg.get("fuzzy_search", {}).get("fuzzy_logic_accuracy_general", 0.70)
 path_general = cfg.get("fuzzy_search", {}).get("path_general", "config/data/general_QA.json")
 use_rapidfuzz = cfg.get("fuzzy_search", {}).get("use_rapidfuzz", True)
+use_ngram_index = cfg.get("fuzzy_search", {}).get("use_ngram_index", False)
+ngram_size = cfg.get("fuzzy_search", {}).get("ngram_size", 3)
+ngram_top_k = cfg.get("fuzzy_search", {}).get("ngram_top_k", 50)
+ngram_max_share = cfg.get("fuzzy_search", {}).get("ngram_max_share", 0.02)
+use_snapshot = cfg.get("fuzzy_search", {}).get("use_snapshot", True)
+watch_interval = cfg.get("fuzzy_search", {}).get("watch_interval", 0)
+cache_size = cfg.get("fuzzy_search", {}).get("cache_size", 256)
+cache_ttl = cfg.get("fuzzy_search", {}).get("cache_ttl", 0)
+scoring_mode = cfg.get("fuzzy_search", {}).get("scoring_mode", "ratio")
+scorer_weights = cfg.get("fuzzy_search", {}).get("scorer_weights", {"ratio": 0.4, "token_set_ratio": 0.3, "partial_ratio": 0.1, "WRatio": 0.2})
+
+# Scorers available for the "fusion" scoring mode
+SCORERS = {
+    "ratio": rf_fuzz.ratio,
+    "token_set_ratio": rf_fuzz.token_set_ratio,
+    "partial_ratio": rf_fuzz.partial_ratio,
+    "WRatio": rf_fuzz.WRatio,
+}
 
 class GENERAL_QA:
     def __init__(self, path: str):
         self.log = logging.getLogger("Diffuse_Search")
-        self.items: List[Dict[str,str]] = []
+        self.path = path
+        self.score_cutoff = fuzzy_logic_accuracy_general * 100.0 # rapidfuzz scores are in the 0-100 range
+        self.fusion = scoring_mode == "fusion" and use_rapidfuzz
+        self.weights = self.fusion_weights(scorer_weights) if self.fusion else {}
+        # Compact storage: answers are stored once, each trigger points to its answer by id.
+        # Everything lives in one immutable Snapshot, a reload swaps the whole reference at once
+        # so a lookup running in another thread never sees a half-built knowledge base.
+        self.kb = Snapshot([], [], array('I'), None)
+        self.cache = QueryCache(cache_size, cache_ttl) # Results by normalized query, cleared on reload
+        self.reload_lock = threading.Lock()
+        self.watcher: threading.Thread | None = None
+        self.watch_stop = threading.Event()
         self.load(path)
+        if watch_interval > 0:
+            self.start_watch(watch_interval)
+
+    @property
+    def triggers(self) -> List[str]:
+        """ Contiguous list of normalized triggers """
+        return self.kb.triggers
+
+    @property
+    def answers(self) -> List[str]:
+        """ Distinct answers """
+        return self.kb.answers
+
+    @property
+    def answer_ids(self) -> array:
+        """ answer_ids[i] -> index in answers of the answer of triggers[i] """
+        return self.kb.answer_ids
+
+    @property
+    def index(self) -> NgramIndex | None:
+        return self.kb.index
     
     def load(self, path: str) -> None:
-        """ Load the GENERAL_QA from a JSON file or line-separated JSON objects """
+        """ Load the GENERAL_QA from its compiled snapshot, a JSON file or line-separated JSON objects """
         self.log.info("Loading GENERAL_QA...")
         try:
-            with open(path, "r", encoding="utf-8") as f:
-                txt = f.read().strip()
-
-            try:
-                obj = json.loads(txt)
-                items: List[Dict[str,str]] = []
-                
-                if isinstance(obj, dict):
-                    for _, lst in obj.items():
-                        if isinstance(lst, list):
-                            for it in lst:
-                                ans = it.get('answer','')
-                                for trig in it.get('triggers',[]):
-                                    trig = norm_text(trig, False)
-                                    if trig and ans:
-                                        items.append({'q': trig, 'a': ans})
-                elif isinstance(obj, list):
-                    items = obj
-                self.items = items
-                self.log.info(f"Loaded {len(self.items)} fuzzy_search entries ")
-            except json.JSONDecodeError:
-                self.items = [json.loads(line) for line in txt.splitlines() if line.strip()]
-                self.log.warning("JSON format issue, attempted line-by-line load.")
+            self.kb = self.compile(path)
         except Exception as e:
-            self.items = []
+            self.kb = Snapshot([], [], array('I'), None)
             self.log.error(f"Could not open fuzzy_search file: {e}")
+
+    def compile(self, path: str) -> Snapshot:
+        """ Build the knowledge base structures (triggers, answers and index) without touching the current ones """
+        with_index = use_rapidfuzz and use_ngram_index
+        if use_snapshot:
+            snap = read_snapshot(path, ngram_size if with_index else 0, ngram_top_k, ngram_max_share)
+            if snap is not None:
+                answer_ids = array('I')
+                answer_ids.frombytes(snap.answer_ids.astype(answer_ids.typecode).tobytes())
+                category_ids = array('I')
+                category_ids.frombytes(snap.category_ids.astype(category_ids.typecode).tobytes())
+                self.log.info(f"Loaded {len(snap.triggers)} fuzzy_search entries from snapshot")
+                return snap._replace(answer_ids=answer_ids, category_ids=category_ids)
+
+        triggers: List[str] = []
+        answer_ids = array('I')
+        answer_table: Dict[str, int] = {} # answer -> id, keeps every distinct answer once
+        category_table: Dict[str, int] = {}
+        category_ids = array('I') # Category of each answer
+
+        def add(trig: str, ans: str, category: str = '') -> None:
+            triggers.append(trig)
+            if ans not in answer_table:
+                answer_table[ans] = len(answer_table)
+                category_ids.append(category_table.setdefault(category, len(category_table)))
+            answer_ids.append(answer_table[ans])
+
+        with open(path, "rb") as f:
+            st = os.fstat(f.fileno()) # Same file as raw, even if it's replaced while we read it
+            raw = f.read()
+        txt = raw.decode("utf-8").strip()
+
+        try:
+            obj = json.loads(txt)
+            
+            if isinstance(obj, dict):
+                for category, lst in obj.items():
+                    if isinstance(lst, list):
+                        for it in lst:
+                            ans = it.get('answer','')
+                            for trig in it.get('triggers',[]):
+                                trig = norm_text(trig, False)
+                                if trig and ans:
+                                    add(trig, ans, category)
+            elif isinstance(obj, list):
+                for it in obj:
+                    add(it.get('q',''), it.get('a',''), it.get('category',''))
+            self.log.info(f"Loaded {len(triggers)} fuzzy_search entries ")
+        except json.JSONDecodeError:
+            for line in txt.splitlines():
+                if line.strip():
+                    it = json.loads(line)
+                    add(it.get('q',''), it.get('a',''), it.get('category',''))
+            self.log.warning("JSON format issue, attempted line-by-line load.")
+
+        index = None
+        if with_index:
+            index = NgramIndex(triggers, ngram_size, ngram_top_k, ngram_max_share)
+            self.log.info(f"Built {ngram_size}-gram index with {len(index.postings)} keys")
+
+        kb = Snapshot(triggers, list(answer_table), answer_ids, index, list(category_table), category_ids)
+        if use_snapshot and triggers:
+            if write_snapshot(path, raw, kb, st):
+                self.log.info("Compiled fuzzy_search snapshot written")
+        return kb
+
+    def reload(self, path: str | None = None, background: bool = True) -> threading.Thread | None:
+        """
+        Rebuild the knowledge base from `path` (default: the current one) and swap it in when ready.
+        Lookups keep using the previous knowledge base meanwhile, and keep it if the rebuild fails.
+        With background=True the rebuild runs in a daemon thread, which is returned.
+        """
+        path = path or self.path
+
+        def rebuild() -> None:
+            with self.reload_lock: # One rebuild at a time, the last one wins
+                self.log.info(f"Reloading GENERAL_QA from {path}...")
+                try:
+                    kb = self.compile(path)
+                except Exception as e:
+                    self.log.error(f"Reload failed, keeping the current knowledge base: {e}")
+                    return
+                if not kb.triggers and self.kb.triggers: # e.g. the file was caught while being written
+                    self.log.warning("Reloaded knowledge base is empty, keeping the current one")
+                    return
+                self.kb, self.path = kb, path
+                self.cache.clear()
+                self.log.info(f"GENERAL_QA reloaded with {len(kb.triggers)} entries")
+
+        if not background:
+            rebuild()
+            return None
+        worker = threading.Thread(target=rebuild, name="GENERAL_QA-reload", daemon=True)
+        worker.start()
+        return worker
+
+    def start_watch(self, interval: float) -> None:
+        """ Poll the knowledge base file every `interval` seconds and reload it when it changes """
+        if self.watcher is not None:
+            return
+
+        def mtime() -> int | None:
+            try:
+                return os.stat(self.path).st_mtime_ns
+            except OSError:
+                return None
+
+        def watch() -> None:
+            last = mtime()
+            while not self.watch_stop.wait(interval):
+                current = mtime()
+                if current is not None and current != last:
+                    last = current
+                    self.reload(background=False) # Already in a background thread
+        
+        self.watch_stop.clear()
+        self.watcher = threading.Thread(target=watch, name="GENERAL_QA-watch", daemon=True)
+        self.watcher.start()
+        self.log.info(f"Watching {self.path} for changes every {interval}s")
+
+    def stop_watch(self) -> None:
+        """ Stop the file watcher, if running """
+        if self.watcher is not None:
+            self.watch_stop.set()
+            self.watcher.join()
+            self.watcher = None
+
+    def __len__(self) -> int:
+        return len(self.kb.triggers)
+
+    def answer_of(self, idx: int, kb: Snapshot | None = None) -> str:
+        """ Answer of the trigger at position idx """
+        kb = kb or self.kb
+        return kb.answers[kb.answer_ids[idx]]
     
     def lookup(self, query: str) -> Dict[str, Any]:
         """ Simple exact or fuzzy match in the GENERAL_QA. Returns dict with 'answer' and 'score' (0.0-1.0) """
-        if not self.items:
+        with METRICS.span("fuzzy_search.lookup"):
+            result = self._lookup(query)
+        METRICS.mark("lookup_done")
+        return result
+
+    def _lookup(self, query: str) -> Dict[str, Any]:
+        generation = self.cache.generation
+        kb = self.kb # Same knowledge base for the whole lookup, even if a reload swaps it meanwhile
+        if not kb.triggers:
             return {"error":"general_QA_vacia","answer":"","score":fuzzy_logic_accuracy_general}
         query = norm_text(query, False)
-        best, best_s = None, 0.0
-
-        for item in self.items:
-            q = item.get('q','')
-            fuzzy = (rf_fuzz.ratio(query, q)/100.0) if use_rapidfuzz else SequenceMatcher(None, query, q).ratio()
-            s = fuzzy
-            if s > best_s:
-                best, best_s = item, s
-        
-        if best and best_s >= fuzzy_logic_accuracy_general:
-            self.log.info(f"Match: '{query}' -> '{best.get('a','')[:30]}...' ({best_s:.2f})")
-            return {"answer": best.get('a',''), "score": round(best_s,3)}
+        cached = self.cache.get(query)
+        if cached is not None:
+            self.log.debug(f"Cache hit: '{query}'")
+            return cached
+
+        if self.fusion:
+            best_idx, best_s = self._fusion_scan(query, kb)
+        elif use_rapidfuzz:
+            best_idx, best_s = self._scan(query, kb)
+        else:
+            best_idx, best_s = None, 0.0
+            for idx, q in enumerate(kb.triggers):
+                s = SequenceMatcher(None, query, q).ratio()
+                if s > best_s:
+                    best_idx, best_s = idx, s
+
+        result = self._result(query, kb, best_idx, best_s)
+        self.cache.put(query, result, generation)
+        return result
+
+    def _scan(self, query: str, kb: Snapshot) -> tuple[int | None, float]:
+        """ Best trigger index and score (0.0-1.0) with rapidfuzz, pruned by the n-gram index when available """
+        if kb.index is not None and query:
+            ids, bound = kb.index.candidates(query)
+            hit = rf_process.extractOne(query, [kb.triggers[i] for i in ids], scorer=rf_fuzz.ratio, processor=None, score_cutoff=self.score_cutoff)
+            # The pruned result is only trusted when no left-out trigger could beat (or tie) it
+            if hit and hit[1] > bound + 1e-6:
+                return ids[hit[2]], hit[1]/100.0
+
+        # One call scores the whole corpus in C++, without cutoff so a miss still reports its best score (to tune the threshold)
+        hit = rf_process.extractOne(query, kb.triggers, scorer=rf_fuzz.ratio, processor=None)
+        if hit is None:
+            return None, 0.0
+        return (hit[2] if hit[1] >= self.score_cutoff else None), hit[1]/100.0
+
+    def fusion_weights(self, weights: Dict[str, float]) -> Dict[str, float]:
+        """ Keep the known scorers with a positive weight and normalize the weights to sum 1 """
+        unknown = set(weights) - set(SCORERS)
+        if unknown:
+            self.log.warning(f"Unknown scorers ignored in scorer_weights: {sorted(unknown)}")
+        weights = {name: float(w) for name, w in weights.items() if name in SCORERS and w and w > 0}
+        if not weights:
+            self.log.warning("No valid scorer_weights, falling back to ratio")
+            return {"ratio": 1.0}
+        total = sum(weights.values())
+        return {name: w / total for name, w in weights.items()}
+
+    def fusion_scores(self, queries: List[str], choices: List[str]) -> np.ndarray:
+        """ Weighted sum (0-100) of every configured scorer, one rapidfuzz cdist call per scorer """
+        fused = np.zeros((len(queries), len(choices)), dtype=np.float32)
+        for name, weight in self.weights.items():
+            fused += weight * rf_process.cdist(queries, choices, scorer=SCORERS[name], processor=None, dtype=np.float32, workers=-1)
+        return fused
+
+    def _fusion_scan(self, query: str, kb: Snapshot) -> tuple[int | None, float]:
+        """ Best trigger index and fused score (0.0-1.0), over the n-gram candidates when the index is enabled """
+        ids = kb.index.candidates(query)[0] if kb.index is not None and query else None
+        choices = [kb.triggers[i] for i in ids] if ids is not None else kb.triggers
+        if not choices:
+            return None, 0.0
+        scores = self.fusion_scores([query], choices)[0]
+        best = int(scores.argmax())
+        best_s = float(scores[best])
+        if best_s < self.score_cutoff:
+            return None, best_s/100.0
+        return (ids[best] if ids is not None else best), best_s/100.0
+
+    def scores_for(self, query: str, choices: List[str], min_score: float) -> np.ndarray:
+        """ Score (0-100) of query against every choice with the configured backend, scores under min_score are 0 """
+        if self.fusion:
+            scores = self.fusion_scores([query], choices)[0]
+            scores[scores < min_score] = 0.0
+            return scores
+        if use_rapidfuzz:
+            return rf_process.cdist([query], choices, scorer=rf_fuzz.ratio, processor=None, score_cutoff=min_score, dtype=np.float32)[0]
+        scores = np.fromiter((SequenceMatcher(None, query, c).ratio()*100.0 for c in choices), dtype=np.float32, count=len(choices))
+        scores[scores < min_score] = 0.0
+        return scores
+
+    def lookup_topk(self, query: str, k: int = 5, min_score: float = 0.0, distinct: bool = True) -> List[Dict[str, Any]]:
+        """
+        Top-k candidates for query, best first, as dicts with 'answer', 'trigger', 'score' (0.0-1.0) and 'category'.
+        Only candidates scoring at least min_score (0.0-1.0) are returned. With distinct=True every answer appears
+        once, with its best scoring trigger. Scores are computed in one vectorized call, no re-scan per candidate.
+        """
+        kb = self.kb
+        if not kb.triggers or k <= 0:
+            return []
+        query = norm_text(query, False)
+        cutoff = max(min_score*100.0, 1e-6) # A 0 score means "pruned", never a candidate
+
+        if kb.index is not None and query and not self.fusion:
+            ids, bound = kb.index.candidates(query)
+            top = self._topk_of(kb, ids, self.scores_for(query, [kb.triggers[i] for i in ids], cutoff), k, distinct)
+            # Same guarantee as _scan: keep the pruned top-k only if no left-out trigger could enter it
+            if (len(top) == k and top[-1][1] > bound + 1e-6) or (len(top) < k and bound < cutoff):
+                return [self._candidate(kb, idx, s) for idx, s in top]
+        elif kb.index is not None and query:
+            ids = kb.index.candidates(query)[0]
+            top = self._topk_of(kb, ids, self.scores_for(query, [kb.triggers[i] for i in ids], cutoff), k, distinct)
+            return [self._candidate(kb, idx, s) for idx, s in top]
+
+        top = self._topk_of(kb, None, self.scores_for(query, kb.triggers, cutoff), k, distinct)
+        return [self._candidate(kb, idx, s) for idx, s in top]
+
+    def _topk_of(self, kb: Snapshot, ids: List[int] | None, scores: np.ndarray, k: int, distinct: bool) -> List[tuple[int, float]]:
+        """ (trigger index, score 0-100) of the k best non-zero scores, ties resolved by trigger order """
+        hits = np.flatnonzero(scores)
+        order = hits[np.argsort(-scores[hits], kind="stable")]
+        top: List[tuple[int, float]] = []
+        seen = set()
+        for pos in order:
+            idx = ids[pos] if ids is not None else int(pos)
+            if distinct:
+                a_id = kb.answer_ids[idx]
+                if a_id in seen:
+                    continue
+                seen.add(a_id)
+            top.append((idx, float(scores[pos])))
+            if len(top) == k:
+                break
+        return top
+
+    def _candidate(self, kb: Snapshot, idx: int, score: float) -> Dict[str, Any]:
+        a_id = kb.answer_ids[idx]
+        category = kb.categories[kb.category_ids[a_id]] if kb.categories else ''
+        return {"answer": kb.answers[a_id], "trigger": kb.triggers[idx], "score": round(score/100.0,3), "category": category}
+
+    def lookup_many(self, queries: List[str]) -> List[Dict[str, Any]]:
+        """ Batch version of lookup, scores N queries against M triggers in one vectorized call """
+        kb = self.kb
+        if not kb.triggers:
+            return [{"error":"general_QA_vacia","answer":"","score":fuzzy_logic_accuracy_general} for _ in queries]
+        if not use_rapidfuzz:
+            return [self.lookup(q) for q in queries]
+
+        normalized = [norm_text(q, False) for q in queries]
+        if self.fusion:
+            scores = self.fusion_scores(normalized, kb.triggers)
+        else:
+            scores = rf_process.cdist(normalized, kb.triggers, scorer=rf_fuzz.ratio, processor=None, workers=-1)
+        # N x M score matrix without cutoff: a miss reports its best score under the threshold, like lookup
+        near = scores.max(axis=1)
+        scores[scores < self.score_cutoff] = 0.0
+        best_idx = scores.argmax(axis=1)
+
+        out: List[Dict[str, Any]] = []
+        for row, (query, idx) in enumerate(zip(normalized, best_idx)):
+            best_s = float(scores[row, idx])/100.0
+            if best_s > 0.0:
+                out.append(self._result(query, kb, int(idx), best_s))
+            else:
+                out.append(self._result(query, kb, None, float(near[row])/100.0))
+        return out
+
+    def _result(self, query: str, kb: Snapshot, best_idx: int | None, best_s: float) -> Dict[str, Any]:
+        """ Build the lookup output for the best trigger index found """
+        if best_idx is not None and best_s >= fuzzy_logic_accuracy_general:
+            answer = self.answer_of(best_idx, kb)
+            self.log.info(f"Match: '{query}' -> '{answer[:30]}...' ({best_s:.2f})")
+            return {"answer": answer, "score": round(best_s,3)}
         return {"answer":"","score": round(best_s,3)}
     
     def best_hit(self, res) -> Dict[str, Any]:
-        """ From the result of general_rag.lookup (dict or list of dicts), return the best one (highest score)"""
+        """
+        Return the best hit (highest score) of a query string or of the result of lookup / lookup_topk (dict or list of dicts).
+        For a query it's the top-1 of lookup_topk above the accuracy threshold, or an empty answer.
+        """
+        if isinstance(res, str):
+            top = self.lookup_topk(res, 1, fuzzy_logic_accuracy_general)
+            return top[0] if top else {"answer":"","score":0.0}
         if isinstance(res, list) and res:
             return max((x for x in res if isinstance(x, dict)), key=lambda x: x.get('score', 0.0), default={})
         return res if isinstance(res, dict) else {}
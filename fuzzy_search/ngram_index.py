@@ -0,0 +1,107 @@
+from array import array
+from collections import Counter
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+
+def char_ngrams(s: str, n: int) -> Counter:
+    """ Multiset of the character n-grams of s (strings shorter than n have none) """
+    return Counter(s[i:i+n] for i in range(len(s) - n + 1))
+
+
+class NgramIndex:
+    """
+    Inverted index from character n-grams to trigger ids.
+
+    It is used to pick a small set of candidates before scoring with rf_fuzz.ratio.
+    Besides the candidates, `candidates` returns an upper bound (0-100) of the ratio
+    that any trigger left out can reach, so the caller knows when the pruned search
+    is guaranteed to give the same best hit as the full scan.
+
+    The bound follows from the q-gram lemma: turning a into b with d = del + ins Indel
+    operations destroys at most n n-grams per deletion and n-1 per insertion, so they
+    share at least (|a|+|b|)/2 - n + 1 - (n - 1/2)*d n-grams, and
+    ratio = 1 - d / (|a| + |b|).
+
+    A query only walks the posting lists of its rarer n-grams: n-grams found in more than
+    max_share of the triggers are skipped and counted as shared by every trigger in the
+    bound, so the work per query stays proportional to the touched postings, not to the KB.
+    """
+
+    def __init__(self, triggers: List[str], n: int = 3, top_k: int = 50, max_share: float = 1.0):
+        self.n = n
+        self.top_k = top_k
+        self.max_share = max_share
+        self.lengths = np.fromiter((len(t) for t in triggers), dtype=np.int32, count=len(triggers))
+        self.distinct_lengths = np.unique(self.lengths)
+
+        grouped: Dict[str, Tuple[array, array]] = {}
+        for tid, trig in enumerate(triggers):
+            for gram, cnt in char_ngrams(trig, n).items():
+                ids, counts = grouped.setdefault(gram, (array('i'), array('i')))
+                ids.append(tid)
+                counts.append(cnt)
+        # Posting lists as NumPy arrays so a query accumulates shared counts without a Python loop per trigger
+        self.postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {
+            gram: (np.frombuffer(ids, dtype=np.int32), np.frombuffer(counts, dtype=np.int32))
+            for gram, (ids, counts) in grouped.items()
+        }
+
+    @classmethod
+    def from_postings(cls, n: int, top_k: int, lengths: np.ndarray, postings: Dict[str, Tuple[np.ndarray, np.ndarray]], max_share: float = 1.0) -> "NgramIndex":
+        """ Rebuild an index from precomputed arrays (e.g. a compiled snapshot) without re-tokenizing the triggers """
+        index = cls.__new__(cls)
+        index.n = n
+        index.top_k = top_k
+        index.max_share = max_share
+        index.lengths = lengths
+        index.distinct_lengths = np.unique(lengths)
+        index.postings = postings
+        return index
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+    def upper_bound(self, shared, len_q: int, len_t: np.ndarray) -> np.ndarray:
+        """ Max rf_fuzz.ratio (0-100) reachable by strings of these lengths sharing at most `shared` n-grams """
+        total = np.maximum(len_q + len_t, 1)
+        by_length = 2.0 * np.minimum(len_q, len_t) / total
+        min_dist = np.maximum(0, total / 2 - self.n + 1 - shared) / (self.n - 0.5)
+        return 100.0 * np.minimum(by_length, 1.0 - min_dist / total)
+
+    def candidates(self, query: str) -> Tuple[List[int], float]:
+        """
+        Return the top-K trigger ids by score bound (sorted by id, as the full scan visits them)
+        and the upper bound of the score of every trigger that was not selected.
+        """
+        max_postings = max(self.top_k, int(self.max_share * len(self.lengths)))
+        ids, counts, skipped = [], [], 0
+        for gram, q_cnt in char_ngrams(query, self.n).items():
+            posting = self.postings.get(gram)
+            if posting is None:
+                continue
+            if len(posting[0]) > max_postings:
+                skipped += q_cnt # Not looked up, any trigger may share it
+                continue
+            ids.append(posting[0])
+            counts.append(np.minimum(posting[1], q_cnt))
+
+        # Shared counts of the touched triggers only: the work is proportional to the postings walked
+        if ids:
+            touched, pos = np.unique(np.concatenate(ids), return_inverse=True)
+            shared = np.bincount(pos, weights=np.concatenate(counts)) + skipped
+        else:
+            touched, shared = np.zeros(0, dtype=np.int32), np.zeros(0)
+        bounds = self.upper_bound(shared, len(query), self.lengths[touched])
+
+        if touched.size > self.top_k:
+            part = np.argpartition(bounds, -self.top_k)
+            top = touched[part[-self.top_k:]]
+            bound = float(bounds[part[:-self.top_k]].max())
+        else:
+            top = touched
+            bound = 0.0
+        if touched.size < len(self.lengths): # Untouched triggers share at most the skipped n-grams
+            bound = max(bound, float(self.upper_bound(skipped, len(query), self.distinct_lengths).max()))
+        return np.sort(top).tolist(), bound
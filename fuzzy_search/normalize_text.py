@@ -1,7 +1,24 @@
+import hashlib
 import re
+import logging
 import unicodedata
+from functools import lru_cache
+from .courtesy import CourtesyStripper
+
+# Configuration
+from pathlib import Path
+import yaml
+
+BASE_DIR = Path(__file__).parent.parent
+SETTINGS = BASE_DIR / "config" / "settings.yml"
+
+with SETTINGS.open("r", encoding="utf-8") as f:
+    cfg = yaml.safe_load(f) or {}
+
+path_courtesy = cfg.get("fuzzy_search", {}).get("path_courtesy", "config/data/courtesy_phrases.json")
 
 #------------------------ Courtesy words ------------------------#
+# Previous regex based stripper, kept as fallback when the phrases file can't be loaded
 COURTESY_RE = re.compile(r"""
 (?ix)                                   # i: ignorecase, x: verbose
 (?<!\w)                                  # borde izquierdo (no carácter de palabra)
@@ -53,6 +70,54 @@ COURTESY_RE = re.compile(r"""
 """, re.IGNORECASE | re.VERBOSE)
 
 #-------------------------- Text Normalization ------------------------#
+NORM_VERSION = 1 # Bump whenever norm_text changes its output, compiled KB snapshots depend on it
+ALLOWED = frozenset("abcdefghijklmnopqrstuvwxyz0123456789 ")
+
+class FoldTable(dict):
+    """
+    str.translate table that folds one character at a time, filled lazily and cached:
+    NFD + drop non-ascii (accents), lowercase, and anything outside [a-z0-9 ] becomes a space.
+    Folding per character gives the same result as on the whole string because NFD only
+    reorders combining marks, which are dropped anyway.
+    """
+    def __missing__(self, code: int) -> str:
+        folded = unicodedata.normalize('NFD', chr(code)).encode('ascii', 'ignore').decode("ascii").lower()
+        folded = "".join(c if c in ALLOWED else " " for c in folded)
+        self[code] = folded
+        return folded
+
+FOLD_TABLE = FoldTable()
+MEMO_MAX_LEN = 64 # Queries and triggers are short, longer strings skip the memo
+
+def _norm_text(s: str, courtesy_flag: bool) -> str:
+    s = " ".join(s.translate(FOLD_TABLE).split())
+    if courtesy_flag:
+        if COURTESY is not None:
+            s = COURTESY.strip(s)
+        else:
+            s = " ".join(COURTESY_RE.sub(' ', s).split())
+    return s
+
+def load_courtesy(path: str) -> CourtesyStripper | None:
+    """ Compile the courtesy phrases file (relative paths are resolved from the repo root) """
+    p = Path(path)
+    if not p.is_absolute() and not p.exists():
+        p = BASE_DIR / p
+    try:
+        return CourtesyStripper.from_file(str(p), lambda phrase: _norm_text(phrase, False))
+    except (OSError, ValueError) as e:
+        logging.getLogger("Diffuse_Search").warning(f"Could not load courtesy phrases, using the built-in regex: {e}")
+        return None
+
+COURTESY = load_courtesy(path_courtesy)
+
+def normalizer_tag() -> bytes:
+    """ Fingerprint of what norm_text depends on (NORM_VERSION and the courtesy phrases), stored in KB snapshots """
+    phrases = COURTESY.phrases() if COURTESY is not None else [COURTESY_RE.pattern]
+    return hashlib.sha256("\n".join([str(NORM_VERSION), *phrases]).encode("utf-8")).digest()[:8]
+
+_norm_text_memo = lru_cache(maxsize=4096)(_norm_text)
+
 def norm_text(s: str, courtesy_flag: bool) -> str:
     """ Normalize text for matching:
     - lowercase
@@ -60,13 +125,6 @@ def norm_text(s: str, courtesy_flag: bool) -> str:
     - remove punctuation (keep spaces)
     - remove courtesy words (por favor, gracias, etc)
     - collapse multiple spaces"""
-
-    s = unicodedata.normalize('NFD', s).encode('ascii', 'ignore').decode("ascii")
-    s = re.sub(r'[^a-z0-9 ]+',' ', s.lower())
-    if courtesy_flag:
-        s = COURTESY_RE.sub(' ', s)
-    return re.sub(r'\s+',' ', s).strip()
-
-
-
-
+    if len(s) <= MEMO_MAX_LEN:
+        return _norm_text_memo(s, courtesy_flag)
+    return _norm_text(s, courtesy_flag)
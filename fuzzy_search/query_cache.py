@@ -0,0 +1,66 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+class QueryCache:
+    """
+    Bounded LRU cache of lookup results keyed by the normalized query.
+
+    Entries older than `ttl` seconds are treated as misses (ttl <= 0 disables expiry).
+    `clear()` starts a new generation: results computed before it (e.g. against the
+    knowledge base that a reload just replaced) are dropped by `put`.
+    """
+
+    def __init__(self, max_size: int = 256, ttl: float = 0.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries: "OrderedDict[str, tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """ Cached result for key (a copy), or None """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and self.ttl > 0 and time.monotonic() - entry[0] > self.ttl:
+                del self.entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return dict(entry[1])
+
+    def put(self, key: str, value: Dict[str, Any], generation: int) -> None:
+        """ Store value unless the cache was cleared since `generation` was read """
+        if self.max_size <= 0:
+            return
+        with self.lock:
+            if generation != self.generation:
+                return
+            self.entries[key] = (time.monotonic(), dict(value))
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.generation += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """ Hit/miss counters, e.g. to log them in production """
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self.entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            }
@@ -0,0 +1,166 @@
+import hashlib
+import logging
+import mmap
+import os
+import struct
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .ngram_index import NgramIndex
+from .normalize_text import normalizer_tag
+
+#------------------------ Compiled knowledge-base snapshot ------------------------#
+# Binary layout (little endian), every section starts on an 8-byte boundary:
+#   header  -> magic, version, n-gram size (0 = no index), source mtime_ns, size, sha256, normalizer tag and section sizes
+#   triggers  -> normalized triggers joined with NUL (utf-8)
+#   answers   -> distinct answers joined with NUL (utf-8)
+#   answer_ids -> uint32 per trigger, index into answers
+#   categories -> distinct categories joined with NUL (utf-8)
+#   category_ids -> uint32 per answer, index into categories
+#   grams, posting offsets, posting ids, posting counts -> the n-gram index (only when n-gram size > 0)
+# Loading maps the file and reads the numeric sections as zero-copy NumPy views, no pickle involved.
+
+MAGIC = b"GQAS"
+VERSION = 3
+HEADER = struct.Struct("<4sIIQQ32s8sIIIII9Q")
+SEP = "\x00"
+
+log = logging.getLogger("Diffuse_Search")
+
+
+class Snapshot(NamedTuple):
+    triggers: List[str]
+    answers: List[str]
+    answer_ids: Sequence[int] # array('I') in memory, uint32 NumPy view when read from disk
+    index: Optional[NgramIndex]
+    categories: List[str] = []
+    category_ids: Sequence[int] = () # Category of each answer
+
+
+def snapshot_path(source: str) -> Path:
+    """ The snapshot lives next to the knowledge base it was compiled from """
+    return Path(f"{source}.snapshot")
+
+
+def source_digest(data: bytes) -> bytes:
+    return hashlib.sha256(data).digest()
+
+
+def _pad(n: int) -> int:
+    return (-n) % 8
+
+
+def write_snapshot(source: str, data: bytes, snap: Snapshot, st: os.stat_result) -> bool:
+    """
+    Compile the knowledge base into its binary snapshot. `data` are the raw bytes of the source file
+    and `st` its fstat, taken on the same open file before reading them.
+    """
+    strings = snap.triggers + snap.answers + snap.categories + (list(snap.index.postings) if snap.index else [])
+    if any(SEP in s for s in strings):
+        log.warning("Knowledge base contains NUL characters, snapshot not written")
+        return False
+
+    triggers = SEP.join(snap.triggers).encode("utf-8")
+    answers = SEP.join(snap.answers).encode("utf-8")
+    answer_ids = np.asarray(snap.answer_ids, dtype="<u4").tobytes()
+    categories = SEP.join(snap.categories).encode("utf-8")
+    category_ids = np.asarray(snap.category_ids, dtype="<u4").tobytes()
+
+    sections = [triggers, answers, answer_ids, categories, category_ids]
+    n, n_grams, n_postings = 0, 0, 0
+    if snap.index is not None:
+        n = snap.index.n
+        grams = list(snap.index.postings)
+        ids = [snap.index.postings[g][0] for g in grams]
+        counts = [snap.index.postings[g][1] for g in grams]
+        offsets = np.zeros(len(grams) + 1, dtype="<u4")
+        np.cumsum([len(x) for x in ids], out=offsets[1:])
+        n_grams, n_postings = len(grams), int(offsets[-1])
+        sections += [
+            SEP.join(grams).encode("utf-8"),
+            offsets.tobytes(),
+            np.concatenate(ids).astype("<i4").tobytes() if ids else b"",
+            np.concatenate(counts).astype("<i4").tobytes() if counts else b"",
+        ]
+    sizes = [len(s) for s in sections] + [0] * (9 - len(sections))
+
+    header = HEADER.pack(MAGIC, VERSION, n, st.st_mtime_ns, st.st_size, source_digest(data), normalizer_tag(),
+                         len(snap.triggers), len(snap.answers), len(snap.categories), n_grams, n_postings, *sizes)
+    out = snapshot_path(source)
+    tmp = out.with_name(out.name + ".tmp")
+    try:
+        with open(tmp, "wb") as f:
+            f.write(header)
+            f.write(b"\0" * _pad(len(header)))
+            for sec in sections:
+                f.write(sec)
+                f.write(b"\0" * _pad(len(sec)))
+        os.replace(tmp, out) # Atomic, a reader never sees a half written snapshot
+    except OSError as e:
+        log.warning(f"Could not write fuzzy_search snapshot: {e}")
+        return False
+    return True
+
+
+def read_snapshot(source: str, ngram_n: int, top_k: int, max_share: float = 1.0) -> Optional[Snapshot]:
+    """
+    Load the compiled snapshot of `source`, or None if it's missing, stale or built with a different n-gram size
+    or normalizer (norm_text version and courtesy phrases).
+    A changed mtime alone doesn't invalidate it when the content hash still matches.
+    """
+    path = snapshot_path(source)
+    try:
+        st = os.stat(source)
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+    if len(mm) < HEADER.size:
+        return None
+    (magic, version, n, mtime_ns, size, digest, norm_tag, n_triggers, n_answers, n_categories,
+     n_grams, n_postings, *sizes) = HEADER.unpack_from(mm, 0)
+    if magic != MAGIC or version != VERSION or n != ngram_n or norm_tag != normalizer_tag():
+        return None
+    if (mtime_ns, size) != (st.st_mtime_ns, st.st_size):
+        with open(source, "rb") as f:
+            if source_digest(f.read()) != digest:
+                return None
+
+    pos = HEADER.size + _pad(HEADER.size)
+    view = memoryview(mm)
+    sections = []
+    for sec_size in sizes:
+        sections.append(view[pos:pos + sec_size])
+        pos += sec_size + _pad(sec_size)
+
+    try:
+        triggers = str(sections[0], "utf-8").split(SEP) if n_triggers else []
+        answers = str(sections[1], "utf-8").split(SEP) if n_answers else []
+        answer_ids = np.frombuffer(sections[2], dtype="<u4")
+        categories = str(sections[3], "utf-8").split(SEP) if n_categories else []
+        category_ids = np.frombuffer(sections[4], dtype="<u4")
+        if len(triggers) != n_triggers or len(answers) != n_answers or len(answer_ids) != n_triggers:
+            return None
+        if len(categories) != n_categories or len(category_ids) != n_answers:
+            return None
+
+        index = None
+        if n:
+            grams = str(sections[5], "utf-8").split(SEP) if n_grams else []
+            offsets = np.frombuffer(sections[6], dtype="<u4")
+            ids = np.frombuffer(sections[7], dtype="<i4")
+            counts = np.frombuffer(sections[8], dtype="<i4")
+            if len(grams) != n_grams or len(ids) != n_postings or len(counts) != n_postings:
+                return None
+            postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {
+                g: (ids[offsets[i]:offsets[i + 1]], counts[offsets[i]:offsets[i + 1]])
+                for i, g in enumerate(grams)
+            }
+            lengths = np.fromiter((len(t) for t in triggers), dtype=np.int32, count=n_triggers)
+            index = NgramIndex.from_postings(n, top_k, lengths, postings, max_share)
+    except (UnicodeDecodeError, ValueError):
+        return None
+    return Snapshot(triggers, answers, answer_ids, index, categories, category_ids)
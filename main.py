@@ -1,10 +1,13 @@
 import logging
+import threading
 from utils.utils import LoadModel, configure_logging
 from stt.wake_word import WakeWord
 from stt.audio_listener import AudioListener
 from stt.speech_to_text import SpeechToText
+from stt.barge_in import BargeIn, barge_in_enabled
 from fuzzy_search.fuzzy_search import GENERAL_QA
 from tts.text_to_speech import TTS
+from utils.metrics import METRICS
 
 # Configuration
 from pathlib import Path
@@ -22,13 +25,13 @@ path_general = cfg.get("fuzzy_search", {}).get("path_general", "config/data/gene
 voice = cfg.get("tts", {}).get("voice", 1)
 
 class OctybotAgent:
-    def __init__(self):
+    def __init__(self, start_stream: bool = True, audio_listener=None, audio_sink=None):
         configure_logging() # <--- Initialize color logging
         self.log = logging.getLogger("System")
         model = LoadModel()
         
-        #Speech-to-Text
-        self.audio_listener = AudioListener()
+        #Speech-to-Text (audio_listener / audio_sink replace the microphone / sound card, e.g. for replays)
+        self.audio_listener = audio_listener or AudioListener()
         self.wake_word = WakeWord(str(model.ensure_model("wake_word")[0]))
         self.stt = SpeechToText(str(model.ensure_model("stt")[1]), "base") #Other Model "base", id = 1
 
@@ -37,12 +40,16 @@ class OctybotAgent:
 
         #Text-to-Speech
         voice_id, decoder = model.voice_pair(voice)
-        self.tts = TTS(str(model.ensure_model("tts")[voice_id]), str(model.ensure_model("tts")[decoder]))
+        self.tts = TTS(str(model.ensure_model("tts")[voice_id]), str(model.ensure_model("tts")[decoder]), sink=audio_sink)
 
-        # Start the audio stream
-        self.audio_listener.start_stream()
-        
-        self.log.info("System Ready & Listening...")
+        #Barge-in: speech over an answer stops it and becomes the next question
+        self.barge_in = BargeIn(self.wake_word) if barge_in_enabled else None
+        self.pending_utterance = None
+
+        # Start the audio stream (callback based runtimes start their own)
+        if start_stream:
+            self.audio_listener.start_stream()
+            self.log.info("System Ready & Listening...")
     
 
     def main(self):
@@ -56,6 +63,10 @@ class OctybotAgent:
 
         text_transcribed = None
 
+        if self.pending_utterance is not None: # The user talked over the last answer
+            utterance, self.pending_utterance = self.pending_utterance, None
+            text_transcribed = self.stt.worker_loop(utterance)
+
         while text_transcribed == None:
             audio_capture = self.audio_listener.read_frame(self.wake_word.frame_samples)
             wake_word_buffer =  self.wake_word.wake_word_detector(audio_capture)
@@ -65,22 +76,49 @@ class OctybotAgent:
         
         if out.get('answer') and out.get('score', 0.0) >= fuzzy_logic_accuracy_general:
             out = out.get('answer')
-            get_audio = self.tts.synthesize(out)
-            self.tts.play_audio_with_amplitude(get_audio)
+            self.speak(out)
 
         # IMPORTANT:  In this case the exception "else" is added in the main, so it  gives flexibility to add custom next steps to the system.
         # Considering that this let you work as a state machine, so for example, if you want to the LLM that works with internet,
         # you can add the next steps without modifying the core system.
 
         else:
-            get_audio = self.tts.synthesize("No se encontró una respuesta adecuada")
-            self.tts.play_audio_with_amplitude(get_audio)
+            self.speak("No se encontró una respuesta adecuada")
             self.log.info("No se encontró una respuesta adecuada.")
 
-    
+    def speak(self, text: str) -> None:
+        """ Say text, with barge-in the microphone is watched meanwhile and speech cuts the answer short """
+        if self.barge_in is None:
+            self.tts.speak(text)
+            return
+
+        cancel, done = threading.Event(), threading.Event()
+        self.barge_in.start(cancel)
+
+        def monitor():
+            # Keeps reading after the answer ends while an interruption is being recorded
+            while not done.is_set() or self.barge_in.triggered:
+                utterance = self.barge_in.feed(self.audio_listener.read_frame(self.wake_word.frame_samples))
+                if utterance is not None:
+                    self.pending_utterance = utterance
+                    return
+
+        thread = threading.Thread(target=monitor, name="barge-in", daemon=True)
+        thread.start()
+        self.tts.speak(text, cancel=cancel)
+        done.set()
+        thread.join()
+        self.barge_in.stop()
+
     def stop(self):
         self.audio_listener.terminate()
-        self.tts.stop_tts()
+        self.diff.stop_watch()
+        self.log.info(f"fuzzy_search cache: {self.diff.cache.stats()}")
+        if self.tts.cache is not None:
+            self.log.info(f"TTS audio cache: {self.tts.cache.stats()}")
+        if METRICS.enabled:
+            self.log.info(f"Latency metrics: {METRICS.snapshot()}")
+        self.tts.terminate()
         self.log.warning("System Stopped")
 
 
@@ -0,0 +1,133 @@
+import asyncio
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict
+
+from main import OctybotAgent, cfg, fuzzy_logic_accuracy_general
+from utils.metrics import METRICS
+
+frame_queue_size = cfg.get("async_runtime", {}).get("frame_queue_size", 500)
+executor_workers = cfg.get("async_runtime", {}).get("executor_workers", 2)
+status_port = cfg.get("async_runtime", {}).get("status_port", 0)
+
+NO_ANSWER = "No se encontró una respuesta adecuada"
+
+
+class AsyncOctybotAgent(OctybotAgent):
+    """
+    asyncio runtime for the agent.
+
+    PyAudio runs in callback mode and pushes every frame into an asyncio.Queue, the wake word
+    runs on the event loop, and the blocking Whisper / Piper / playback calls run in a thread
+    pool. The loop is never blocked by them, so other coroutines (e.g. the status endpoint)
+    share it without delaying wake-word detection.
+    """
+
+    def __init__(self):
+        super().__init__(start_stream=False)
+        self.executor = ThreadPoolExecutor(max_workers=executor_workers, thread_name_prefix="agent")
+        self.frames: asyncio.Queue | None = None
+        self.turn_lock: asyncio.Lock | None = None # One answer at a time
+        self.tasks: set[asyncio.Task] = set()
+        self.dropped_frames = 0
+        self.interactions = 0
+
+    def push_frame(self, frame: bytes) -> None:
+        """ Runs on the loop: enqueue a captured frame, dropping the oldest one if the queue is full """
+        if self.frames.full():
+            self.frames.get_nowait()
+            self.dropped_frames += 1
+        self.frames.put_nowait(frame)
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        self.frames = asyncio.Queue(maxsize=frame_queue_size)
+        self.turn_lock = asyncio.Lock()
+
+        # PortAudio's thread only hands the frame over to the loop
+        self.audio_listener.start_callback_stream(self.wake_word.frame_samples, lambda frame: loop.call_soon_threadsafe(self.push_frame, frame))
+        server = await asyncio.start_server(self.status_handler, "127.0.0.1", status_port) if status_port else None
+        self.log.info("System Ready & Listening...")
+
+        try:
+            while True:
+                frame = await self.frames.get()
+                if self.barge_in is not None and self.barge_in.active: # An answer is playing
+                    utterance = self.barge_in.feed(frame)
+                else:
+                    utterance = self.wake_word.wake_word_detector(frame)
+                if utterance is not None:
+                    # The wake word view lives in its ring buffer, respond() reads it much later
+                    task = asyncio.create_task(self.respond(bytes(utterance)))
+                    self.tasks.add(task)
+                    task.add_done_callback(self.tasks.discard)
+        finally:
+            if server is not None:
+                server.close()
+                await server.wait_closed()
+
+    async def respond(self, utterance: bytes) -> None:
+        """ STT -> retrieval -> TTS for one utterance, the heavy steps run in the executor """
+        loop = asyncio.get_running_loop()
+        text = await loop.run_in_executor(self.executor, self.stt.worker_loop, utterance)
+        if text is None:
+            return
+
+        out = await loop.run_in_executor(self.executor, lambda: self.diff.best_hit(self.diff.lookup(text)))
+        if out.get('answer') and out.get('score', 0.0) >= fuzzy_logic_accuracy_general:
+            answer = out.get('answer')
+        else:
+            answer = NO_ANSWER
+            self.log.info("No se encontró una respuesta adecuada.")
+
+        async with self.turn_lock:
+            cancel = threading.Event()
+            if self.barge_in is not None:
+                self.barge_in.start(cancel)
+            try:
+                await loop.run_in_executor(self.executor, lambda: self.tts.speak(answer, cancel=cancel))
+            finally:
+                if self.barge_in is not None and not self.barge_in.triggered: # Else it ends with the interrupting utterance
+                    self.barge_in.stop()
+        self.interactions += 1
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "frames_queued": self.frames.qsize() if self.frames else 0,
+            "frames_dropped": self.dropped_frames,
+            "pending_answers": len(self.tasks),
+            "interactions": self.interactions,
+            "fuzzy_search_cache": self.diff.cache.stats(),
+            "latency": METRICS.snapshot() if METRICS.enabled else None,
+        }
+
+    async def status_handler(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """ Minimal HTTP endpoint: any request gets the status as JSON """
+        try:
+            await reader.readline()
+            body = json.dumps(self.status()).encode("utf-8")
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                         b"Content-Length: " + str(len(body)).encode() + b"\r\nConnection: close\r\n\r\n" + body)
+            await writer.drain()
+        finally:
+            writer.close()
+
+    def stop(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        super().stop()
+
+
+ #———— Example Usage ————-
+if "__main__" == __name__:
+    llm = AsyncOctybotAgent()
+    print("\n" + "="*50)
+    print(" Octybot Virtual Agent (asyncio)")
+    print(" Say 'Ok Robot' to start...")
+    print(" Press Ctrl+C to exit")
+    print("="*50 + "\n")
+    try:
+        asyncio.run(llm.run())
+    except KeyboardInterrupt:
+        llm.stop()
+        exit(0)
@@ -0,0 +1,104 @@
+import time
+from typing import Any, Dict
+
+from main import OctybotAgent, cfg, fuzzy_logic_accuracy_general
+from utils.stages import Stage, StageQueue
+
+frame_queue_size = cfg.get("pipeline", {}).get("frame_queue_size", 500)
+utterance_queue_size = cfg.get("pipeline", {}).get("utterance_queue_size", 2)
+text_queue_size = cfg.get("pipeline", {}).get("text_queue_size", 2)
+answer_queue_size = cfg.get("pipeline", {}).get("answer_queue_size", 2)
+stats_interval = cfg.get("pipeline", {}).get("stats_interval", 30)
+
+NO_ANSWER = "No se encontró una respuesta adecuada"
+
+
+class OctybotPipeline(OctybotAgent):
+    """
+    Same agent as OctybotAgent, but every step runs in its own thread:
+
+        capture -> [frames] -> wake_word -> [utterances] -> stt -> [texts] -> retrieval -> [answers] -> tts
+
+    Queues are bounded. The frames queue drops the oldest frame when full, so the microphone
+    is always read even while Whisper transcribes or Piper plays an answer; the others block
+    the producer (backpressure). Queue depths and stage latencies are available from stats().
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.frames = StageQueue("frames", frame_queue_size, policy="drop_oldest")
+        self.utterances = StageQueue("utterances", utterance_queue_size)
+        self.texts = StageQueue("texts", text_queue_size)
+        self.answers = StageQueue("answers", answer_queue_size)
+
+        self.stages = [
+            Stage("capture", self.capture, outbox=self.frames),
+            Stage("wake_word", self.detect, self.frames, self.utterances),
+            Stage("stt", self.stt.worker_loop, self.utterances, self.texts),
+            Stage("retrieval", self.retrieve, self.texts, self.answers),
+            Stage("tts", self.speak, self.answers),
+        ]
+
+    def capture(self) -> bytes:
+        """ Source stage: one frame from the microphone """
+        return self.audio_listener.read_frame(self.wake_word.frame_samples)
+
+    def detect(self, frame: bytes) -> bytes | None:
+        """ Wake word stage: the utterance is copied out of the ring buffer before it is queued to STT """
+        utterance = self.wake_word.wake_word_detector(frame)
+        return bytes(utterance) if utterance is not None else None
+
+    def retrieve(self, text: str) -> str:
+        """ Transcript -> answer to speak """
+        out = self.diff.best_hit(self.diff.lookup(text))
+        if out.get('answer') and out.get('score', 0.0) >= fuzzy_logic_accuracy_general:
+            return out.get('answer')
+        self.log.info("No se encontró una respuesta adecuada.")
+        return NO_ANSWER
+
+    def speak(self, answer: str) -> None:
+        self.tts.speak(answer)
+
+    def stats(self) -> Dict[str, Any]:
+        """ Queue depths (current/max/dropped) and per-stage latencies """
+        return {
+            "queues": {q.name: q.stats() for q in (self.frames, self.utterances, self.texts, self.answers)},
+            "stages": {s.name: s.stats() for s in self.stages},
+        }
+
+    def run(self) -> None:
+        """ Start every stage and block, logging stats every stats_interval seconds """
+        for stage in reversed(self.stages): # Consumers first, so nothing captured waits for them
+            stage.start()
+        last = time.monotonic()
+        while True:
+            time.sleep(0.5)
+            if stats_interval and time.monotonic() - last >= stats_interval:
+                last = time.monotonic()
+                self.log.info(f"Pipeline stats: {self.stats()}")
+
+    def stop(self):
+        for stage in self.stages:
+            stage.stop_event.set()
+        for q in (self.frames, self.utterances, self.texts, self.answers):
+            q.close()
+        for stage in self.stages:
+            stage.stop()
+        self.log.info(f"Pipeline stats: {self.stats()}")
+        super().stop()
+
+
+ #———— Example Usage ————-
+if "__main__" == __name__:
+    try:
+        llm = OctybotPipeline()
+        print("\n" + "="*50)
+        print(" Octybot Virtual Agent (pipeline)")
+        print(" Say 'Ok Robot' to start...")
+        print(" Press Ctrl+C to exit")
+        print("="*50 + "\n")
+
+        llm.run()
+    except KeyboardInterrupt:
+        llm.stop()
+        exit(0)
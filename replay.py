@@ -0,0 +1,115 @@
+"""
+Replay recordings through the whole agent (wake word -> STT -> fuzzy_search -> TTS) without
+a microphone or speakers, and report the latency of each stage from the end of speech.
+
+    python -m replay recordings/*.wav [--speed 1.0] [--realtime-sink] [--tail-silence 2.0]
+
+Each recording (16 kHz, mono, int16 WAV or raw PCM) should hold the wake phrase and a
+question, e.g. "ok robot, cómo te llamas".
+"""
+import argparse
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+import webrtcvad
+
+from main import OctybotAgent, fuzzy_logic_accuracy_general
+from stt.file_audio_listener import FileAudioListener
+from stt.wake_word import vad_aggressiveness
+from tts.null_sink import NullAudioSink
+from tts.text_to_speech import sample_rate as tts_sample_rate
+
+STAGES = ["drain_wait", "stt", "lookup", "tts_first_audio", "total"]
+NO_ANSWER = "No se encontró una respuesta adecuada"
+
+
+def speech_end(pcm: bytes, rate: int = 16000) -> int:
+    """ Sample where the last 10 ms frame with speech (webrtcvad) ends, 0 if there is none """
+    vad = webrtcvad.Vad(vad_aggressiveness)
+    n = rate // 100 * 2
+    end = 0
+    for i in range(0, len(pcm) - n + 1, n):
+        if vad.is_speech(pcm[i:i + n], rate):
+            end = (i + n) // 2
+    return end
+
+
+class ReplayBenchmark:
+    """ OctybotAgent fed by FileAudioListener, answering into a NullAudioSink, timing each stage """
+
+    def __init__(self, paths: List[str], speed: float = 1.0, realtime_sink: bool = False, tail_silence_s: float = 2.0):
+        self.listener = FileAudioListener(paths, speed=speed, tail_silence_s=tail_silence_s)
+        self.sink = NullAudioSink(tts_sample_rate, realtime=realtime_sink)
+        self.agent = OctybotAgent(audio_listener=self.listener, audio_sink=self.sink)
+        self.speech_ends = [off + speech_end(pcm, self.listener.sample_rate) for off, pcm in zip(self.listener.offsets, self.listener.pcm)]
+
+    def interaction(self, utterance) -> Dict[str, Any]:
+        """ Same steps as OctybotAgent.main after the wake word, with a timestamp after each one """
+        agent = self.agent
+        t_drain = time.perf_counter()
+        index = self.listener.file_index()
+        text = agent.stt.worker_loop(utterance)
+        t_stt = time.perf_counter()
+
+        out = agent.diff.best_hit(agent.diff.lookup(text)) if text else {}
+        ok = out.get('answer') and out.get('score', 0.0) >= fuzzy_logic_accuracy_general
+        answer = out.get('answer') if ok else NO_ANSWER
+        t_lookup = time.perf_counter()
+
+        self.sink.reset()
+        agent.tts.speak(answer)
+        t_first = self.sink.first_write or time.perf_counter()
+
+        # The utterance can be drained before the speech ends (listen_seconds limit)
+        t_eos = min(self.listener.time_at(self.speech_ends[index]) or t_drain, t_drain)
+        ms = lambda a, b: (b - a) * 1000
+        return {
+            "file": Path(self.listener.paths[index]).name, "text": text, "answer": answer,
+            "drain_wait": ms(t_eos, t_drain), "stt": ms(t_drain, t_stt), "lookup": ms(t_stt, t_lookup),
+            "tts_first_audio": ms(t_lookup, t_first), "total": ms(t_eos, t_first),
+        }
+
+    def run(self) -> List[Dict[str, Any]]:
+        self.listener.start_stream()
+        ww = self.agent.wake_word
+        results = []
+        while True:
+            try:
+                frame = self.listener.read_frame(ww.frame_samples)
+            except EOFError:
+                break
+            utterance = ww.wake_word_detector(frame)
+            if utterance is not None:
+                r = self.interaction(utterance)
+                results.append(r)
+                print(f"{r['file']}: {r['text']!r} -> {r['answer'][:40]!r} | "
+                      + " | ".join(f"{s} {r[s]:7.1f} ms" for s in STAGES))
+        return results
+
+
+def report(results: List[Dict[str, Any]], n_files: int) -> None:
+    print(f"\n{len(results)} interaction(s) from {n_files} file(s), {len({r['file'] for r in results})} file(s) answered")
+    if not results:
+        return
+    print(f"{'stage':<16} {'mean':>9} {'p50':>9} {'p95':>9} {'max':>9}  (ms)")
+    for s in STAGES:
+        v = np.array([r[s] for r in results])
+        print(f"{s:<16} {v.mean():9.1f} {np.percentile(v, 50):9.1f} {np.percentile(v, 95):9.1f} {v.max():9.1f}")
+
+
+#------------------------ CLI ------------------------#
+if "__main__" == __name__:
+    parser = argparse.ArgumentParser(description="End of speech -> first audio out latency over recorded utterances")
+    parser.add_argument("files", nargs="+", help="16 kHz mono int16 WAV (or raw .pcm) recordings")
+    parser.add_argument("--speed", type=float, default=1.0, help="1 = real time, 0 = as fast as possible")
+    parser.add_argument("--realtime-sink", action="store_true", help="Block on playback as a sound card would")
+    parser.add_argument("--tail-silence", type=float, default=2.0, help="Silence (s) appended after each recording")
+    args = parser.parse_args()
+
+    bench = ReplayBenchmark(args.files, args.speed, args.realtime_sink, args.tail_silence)
+    try:
+        report(bench.run(), len(args.files))
+    finally:
+        bench.agent.stop()
@@ -90,6 +90,32 @@ class AudioListener:
                 frames_per_buffer=self.frames_per_buffer,
             )
 
+    def start_callback_stream(self, frame_samples: int, on_frame) -> None:
+        """
+        Start the audio stream in PyAudio callback mode: on_frame(bytes) is called from PortAudio's
+        thread with every block of frame_samples samples, nothing has to call read_frame.
+        on_frame must return quickly (e.g. hand the frame to a queue).
+        """
+        if self.stream is not None:
+            return
+
+        def callback(in_data, frame_count, time_info, status):
+            if status & pyaudio.paInputOverflow:
+                self.log.warning("Input overflow, audio frames were lost")
+            on_frame(in_data)
+            return (None, pyaudio.paContinue)
+
+        self.stream = self.audio_interface.open(
+            format=pyaudio.paInt16,
+            channels=self.channels,
+            rate=self.sample_rate,
+            input=True,
+            input_device_index=self.device_index,
+            frames_per_buffer=frame_samples,
+            stream_callback=callback,
+        )
+        self.stream.start_stream()
+
     def read_frame(self, frame_samples: int) -> bytes:
         """ Read a frame of audio data from the stream."""
         if self.stream is None:
@@ -0,0 +1,91 @@
+import logging
+import threading
+from collections import deque
+
+from stt.wake_word import WakeWord
+from utils.metrics import METRICS
+
+# Configuration
+from pathlib import Path
+import yaml
+
+BASE_DIR = Path(__file__).parent.parent
+SETTINGS = BASE_DIR / "config" / "settings.yml"
+
+with SETTINGS.open("r", encoding="utf-8") as f:
+    cfg = yaml.safe_load(f) or {}
+
+barge_in_enabled = cfg.get("barge_in", {}).get("enabled", False)
+min_speech_ms = cfg.get("barge_in", {}).get("min_speech_ms", 200)
+energy_threshold = cfg.get("barge_in", {}).get("energy_threshold", 1000)
+preroll_ms = cfg.get("barge_in", {}).get("preroll_ms", 300)
+
+
+class BargeIn:
+    """
+    Watches the microphone while an answer is played, so the user can talk over it.
+
+    `start(cancel)` arms it for one answer and every captured frame is then passed to
+    `feed()`, which runs the WakeWord VAD on it. After min_speech_ms of continuous speech the
+    cancel token is set (TTS stops within one chunk) and the speech is recorded, from a short
+    pre-roll, until the same silence that drains a wake-word utterance; `feed()` then returns
+    it for STT. No wake phrase is needed. The speaker is heard by the microphone too:
+    energy_threshold has to sit above its level, or use a headset / echo-cancelled input.
+    """
+
+    def __init__(self, wake_word: WakeWord, min_speech_ms: int = min_speech_ms, energy_threshold: float = energy_threshold, preroll_ms: int = preroll_ms):
+        self.log = logging.getLogger("Wake_Word")
+        self.ww = wake_word
+        self.min_speech_ms = min_speech_ms
+        self.energy_threshold = energy_threshold
+        self.preroll = deque(maxlen=max(1, int(preroll_ms // wake_word.frame_ms)))
+        self.cancel: threading.Event | None = None
+        self.active = False
+        self.triggered = False
+        self.speech_ms = 0
+        self.silent_frames = 0 # 10 ms sub-frames of silence since the last speech
+        self.audio = bytearray()
+
+    def start(self, cancel: threading.Event) -> None:
+        """ Arm for one answer, cancel is its playback token """
+        self.cancel = cancel
+        self.active = True
+        self.triggered = False
+        self.speech_ms = 0
+        self.silent_frames = 0
+        self.preroll.clear()
+        self.audio = bytearray()
+
+    def stop(self) -> None:
+        """ Answer over without interruption (an utterance being recorded is dropped) """
+        self.active = False
+        self.triggered = False
+
+    def feed(self, frame: bytes) -> None | bytes:
+        """ Process one captured frame, returns the interrupting utterance once it is complete """
+        if not self.active:
+            return None
+        flags = self.ww.speech_flags(frame, self.energy_threshold)
+
+        if not self.triggered:
+            self.preroll.append(frame)
+            for flag in flags:
+                self.speech_ms = self.speech_ms + 10 if flag else 0
+            if self.speech_ms >= self.min_speech_ms:
+                self.log.info("Barge-in: speech during the answer, stopping playback")
+                self.triggered = True
+                self.cancel.set()
+                METRICS.mark("wake_detected")
+                self.audio = bytearray(b"".join(self.preroll))
+            return None
+
+        self.audio += frame
+        for flag in flags:
+            self.silent_frames = 0 if flag else self.silent_frames + 1
+        if self.silent_frames >= self.ww.silence_frames_to_drain or len(self.audio) >= self.ww.max:
+            self.log.info("Audio sent to STT")
+            METRICS.mark("buffer_drained")
+            self.active = False
+            self.triggered = False
+            return bytes(self.audio)
+        return None
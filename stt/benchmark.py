@@ -0,0 +1,90 @@
+"""
+Offline benchmarks for the audio front end, replaying a recorded WAV (16 kHz, mono, int16).
+
+    python -m stt.benchmark wake_word --wav recording.wav [--frame-ms 10 30]
+    python -m stt.benchmark idle [--seconds 60] [--wav room.wav]
+"""
+import argparse
+import time
+import wave
+from typing import Dict
+
+import numpy as np
+
+from utils.utils import LoadModel
+from stt.wake_word import WakeWord
+
+
+def read_wav(path: str, sample_rate: int = 16000) -> bytes:
+    """ PCM of a 16 kHz mono int16 WAV """
+    with wave.open(path, "rb") as wf:
+        if wf.getframerate() != sample_rate or wf.getnchannels() != 1 or wf.getsampwidth() != 2:
+            raise ValueError(f"{path}: expected {sample_rate} Hz mono int16, got {wf.getframerate()} Hz, "
+                             f"{wf.getnchannels()} channel(s), {8 * wf.getsampwidth()} bit")
+        return wf.readframes(wf.getnframes())
+
+
+def room_noise(seconds: float, level: float = 40.0, seed: int = 0) -> bytes:
+    """ Empty room: low gaussian noise plus a faint 50 Hz hum, 16 kHz int16 """
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * 16000)) / 16000
+    x = rng.normal(0, level, t.size) + 0.5 * level * np.sin(2 * np.pi * 50 * t)
+    return x.astype(np.int16).tobytes()
+
+
+def bench_wake_word_run(model_path: str, pcm: bytes, frame_ms: int, gate: bool = True) -> Dict[str, float]:
+    """ Feed the whole recording to a fresh WakeWord in frame_ms chunks, as the microphone would """
+    ww = WakeWord(model_path, frame_ms=frame_ms, gate=gate)
+    chunk = ww.frame_samples * 2
+    utterances = 0
+    cpu, wall = time.process_time(), time.perf_counter()
+    for i in range(0, len(pcm) - chunk + 1, chunk):
+        if ww.wake_word_detector(pcm[i:i + chunk]) is not None:
+            utterances += 1
+    return {"cpu_s": time.process_time() - cpu, "wall_s": time.perf_counter() - wall,
+            "calls": len(pcm) // chunk, "utterances": utterances}
+
+
+def bench_wake_word(wav: str, frame_sizes: list) -> None:
+    model_path = str(LoadModel().ensure_model("wake_word")[0])
+    pcm = read_wav(wav)
+    audio_s = len(pcm) / 2 / 16000
+    print(f"{wav}: {audio_s:.1f} s of audio")
+    base = None
+    for frame_ms in frame_sizes:
+        r = bench_wake_word_run(model_path, pcm, frame_ms)
+        base = base or r["cpu_s"]
+        print(f"{frame_ms:>4} ms chunks: {r['calls']:>7} calls | cpu {r['cpu_s']:7.2f} s "
+              f"({100 * r['cpu_s'] / audio_s:5.1f}% of real time, {base / r['cpu_s']:4.2f}x) | "
+              f"wall {r['wall_s']:7.2f} s | utterances {r['utterances']}")
+
+
+def bench_idle(seconds: float, wav: str, frame_ms: int) -> None:
+    """ CPU spent listening to an empty room, with and without the Vosk gate """
+    model_path = str(LoadModel().ensure_model("wake_word")[0])
+    pcm = read_wav(wav) if wav else room_noise(seconds)
+    audio_s = len(pcm) / 2 / 16000
+    print(f"{'wav ' + wav if wav else 'synthetic room noise'}: {audio_s:.1f} s, {frame_ms} ms chunks")
+    for gate in (False, True):
+        r = bench_wake_word_run(model_path, pcm, frame_ms, gate)
+        print(f"  vosk_gate {str(gate):<5}: cpu {r['cpu_s']:6.2f} s ({100 * r['cpu_s'] / audio_s:5.2f}% of one core) | "
+              f"wall {r['wall_s']:6.2f} s")
+
+
+#------------------------ CLI ------------------------#
+if "__main__" == __name__:
+    parser = argparse.ArgumentParser(description="audio front end benchmarks")
+    sub = parser.add_subparsers(dest="bench", required=True)
+    p_ww = sub.add_parser("wake_word", help="CPU of VAD + Vosk wake word per chunk size on a recorded WAV")
+    p_ww.add_argument("--wav", required=True, help="16 kHz mono int16 recording")
+    p_ww.add_argument("--frame-ms", type=int, nargs="+", default=[10, 30])
+    p_idle = sub.add_parser("idle", help="Idle CPU (no speech) with and without the Vosk gate")
+    p_idle.add_argument("--seconds", type=float, default=60.0, help="Length of the synthetic room noise")
+    p_idle.add_argument("--wav", default=None, help="Use a recording of the empty room instead")
+    p_idle.add_argument("--frame-ms", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.bench == "wake_word":
+        bench_wake_word(args.wav, args.frame_ms)
+    elif args.bench == "idle":
+        bench_idle(args.seconds, args.wav, args.frame_ms)
@@ -0,0 +1,107 @@
+import bisect
+import logging
+import time
+import wave
+from pathlib import Path
+from typing import List, Sequence
+
+# Configuration
+import yaml
+
+BASE_DIR = Path(__file__).parent.parent
+SETTINGS = BASE_DIR / "config" / "settings.yml"
+
+with SETTINGS.open("r", encoding="utf-8") as f:
+    cfg = yaml.safe_load(f) or {}
+
+sample_rate = cfg.get("audio_listener", {}).get("sample_rate", 16000)
+channels = cfg.get("audio_listener", {}).get("channels", 1)
+
+
+def read_pcm(path: str, rate: int = sample_rate) -> bytes:
+    """ int16 mono PCM of a WAV file (checked against rate), or of a raw .pcm/.raw file (assumed to match) """
+    if Path(path).suffix.lower() != ".wav":
+        return Path(path).read_bytes()
+    with wave.open(str(path), "rb") as wf:
+        if wf.getframerate() != rate or wf.getnchannels() != 1 or wf.getsampwidth() != 2:
+            raise ValueError(f"{path}: expected {rate} Hz mono int16, got {wf.getframerate()} Hz, "
+                             f"{wf.getnchannels()} channel(s), {8 * wf.getsampwidth()} bit")
+        return wf.readframes(wf.getnframes())
+
+
+class FileAudioListener:
+    """
+    Drop-in replacement of AudioListener that streams recordings instead of the microphone.
+
+    The files are played one after the other, each followed by `tail_silence_s` of silence so
+    the wake word can drain the utterance. speed=1.0 delivers frames at real-time pace,
+    speed=4.0 four times faster and speed=0 as fast as they are read. read_frame raises
+    EOFError once every file has been delivered. The wall-clock time each sample was
+    delivered is kept (see time_at), so latencies can be measured from a point of the audio.
+    """
+
+    def __init__(self, paths: Sequence[str], speed: float = 1.0, tail_silence_s: float = 2.0):
+        self.log = logging.getLogger("Audio_Listener")
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.speed = speed
+        self.paths = [str(p) for p in paths]
+        self.pcm: List[bytes] = [read_pcm(p) for p in self.paths]
+
+        # One continuous stream: file, silence, file, silence...
+        tail = bytes(int(tail_silence_s * self.sample_rate) * 2 * self.channels)
+        self.offsets: List[int] = [] # First sample of each file in the stream
+        stream, pos = bytearray(), 0
+        for pcm in self.pcm:
+            self.offsets.append(pos)
+            stream += pcm + tail
+            pos += (len(pcm) + len(tail)) // 2
+        self.data = bytes(stream)
+
+        self.position = 0 # Samples delivered
+        self.started = None
+        self.read_ends: List[int] = [] # Sample reached by each read...
+        self.read_times: List[float] = [] # ...and when it was delivered
+        self.stream = None
+        self.log.info(f"Replaying {len(self.paths)} file(s), {len(self.data) / 2 / self.sample_rate:.1f} s of audio at speed {speed}")
+
+    def start_stream(self):
+        """ Start delivering audio, the pacing clock starts here """
+        if self.stream is None:
+            self.stream = True
+            self.started = time.perf_counter()
+
+    def read_frame(self, frame_samples: int) -> bytes:
+        """ Next frame of the recordings, waiting as a microphone would when speed > 0 """
+        if self.stream is None:
+            raise RuntimeError("El Audio stream no se ha comenzado o está fallando la lectura.")
+        start = self.position * 2
+        if start >= len(self.data):
+            raise EOFError("No more audio to replay")
+        frame = self.data[start:start + frame_samples * 2]
+        if len(frame) < frame_samples * 2:
+            frame += bytes(frame_samples * 2 - len(frame))
+        self.position += frame_samples
+
+        if self.speed > 0:
+            wait = self.started + self.position / (self.sample_rate * self.speed) - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+        self.read_ends.append(self.position)
+        self.read_times.append(time.perf_counter())
+        return frame
+
+    def file_index(self) -> int:
+        """ Index of the file being delivered """
+        return max(0, bisect.bisect_right(self.offsets, self.position - 1) - 1)
+
+    def time_at(self, sample: int) -> float | None:
+        """ perf_counter() time at which `sample` of the stream was delivered, None if not yet """
+        i = bisect.bisect_left(self.read_ends, sample + 1)
+        return self.read_times[i] if i < len(self.read_times) else None
+
+    def stop_stream(self):
+        self.stream = None
+
+    def terminate(self):
+        self.stop_stream()
@@ -0,0 +1,52 @@
+class PCMRingBuffer:
+    """
+    Preallocated buffer for the captured PCM of the utterance being recorded.
+
+    Frames are copied once into a fixed bytearray, the recorded utterance is handed out as a
+    contiguous memoryview (no join, no copy). There is one writer (the wake word).
+
+    The next utterance starts where the previous one ended. When the current utterance would
+    not fit before the end of the buffer, it is moved to the start, over the oldest region,
+    without checking whether a view of it is still being read. A drained view is therefore
+    only safe to read on the writer's thread before more audio is written (the synchronous
+    agent transcribes it right away); consumers on other threads must copy it (`bytes(view)`)
+    when they take it over.
+    """
+
+    def __init__(self, max_bytes: int, slots: int = 4):
+        self.max_bytes = max_bytes
+        self.capacity = max_bytes * max(2, slots)
+        self.buf = bytearray(self.capacity)
+        self.view = memoryview(self.buf)
+        self.start = 0 # First byte of the utterance being recorded
+        self.end = 0   # Write position
+
+    def __len__(self) -> int:
+        return self.end - self.start
+
+    def write(self, frame: bytes) -> memoryview:
+        """ Append one frame and return the view of it inside the buffer """
+        n = len(frame)
+        size = self.end - self.start
+        if size + n > self.capacity:
+            raise ValueError(f"Utterance larger than the ring buffer ({self.capacity} bytes)")
+        if self.end + n > self.capacity: # Wrap: move what is recorded so far to the start
+            self.view[:size] = self.view[self.start:self.end]
+            self.start, self.end = 0, size
+        self.view[self.end:self.end + n] = frame
+        self.end += n
+        return self.view[self.end - n:self.end]
+
+    def peek(self) -> memoryview:
+        """ View of the utterance being recorded, it stays in the buffer """
+        return self.view[self.start:self.end]
+
+    def drain(self) -> memoryview:
+        """ Contiguous view of the recorded utterance, the next one starts after it """
+        data = self.view[self.start:self.end]
+        self.start = self.end
+        return data
+
+    def clear(self) -> None:
+        """ Discard the utterance being recorded """
+        self.end = self.start
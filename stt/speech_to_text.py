@@ -2,10 +2,13 @@ from typing import Optional
 from pathlib import Path
 
 import logging
+import threading
 import numpy as np
 import whisper
 from difflib import SequenceMatcher
 
+from utils.metrics import METRICS
+
 # Configuration
 from pathlib import Path
 import yaml
@@ -32,6 +35,10 @@ class SpeechToText:
         model_path = Path(model_path)
 
         self.model = whisper.load_model(model_name, download_root = model_path.parent, device=device_selector)
+
+        # float32 input for Whisper, reused between utterances (grown when needed)
+        self.lock = threading.Lock()
+        self.scratch = np.empty(0, dtype=np.float32)
         
 
         # --- This patch is to avoid a bug from Whisper, it helps to catch commonly known hallucination outputs
@@ -53,12 +60,14 @@ class SpeechToText:
         ]
 
     
-    def worker_loop(self, audio_bytes: bytes) -> Optional[str | None]:
+    def worker_loop(self, audio_bytes: bytes | memoryview) -> Optional[str | None]:
         """With this we can see if we receive text or none"""
         if audio_bytes is None:
             return None
         try:
-            text = self.stt_from_bytes(audio_bytes)
+            with METRICS.span("stt.transcribe"):
+                text = self.stt_from_bytes(audio_bytes)
+            METRICS.mark("transcribed")
             if text:
                 # Check for Hallucinations
                 if self.check_hallucination(text):
@@ -105,22 +114,31 @@ class SpeechToText:
         return False
 
 
-    def stt_from_bytes (self, audio_bytes: bytes) -> Optional[str]:
+    def stt_from_bytes (self, audio_bytes: bytes | memoryview) -> Optional[str]:
         """
         Convert bytes Int16→tensor float32, normalized and run Whisper.
+        audio_bytes can be a view of the wake word ring buffer, it is read without copying it.
         """
         if not audio_bytes: return None
 
-        # Int16 → float32 [-1, 1]
+        # Int16 view over the same memory
         pcm = np.frombuffer(audio_bytes, dtype=np.int16)
         if pcm.size == 0:
             return None
 
-        x = pcm.astype(np.float32) / 32768.0
-
         if sample_rate != 16000:
             self.log.warning(f"Whisper only works at 16 Khz, info is being sent at {sample_rate}hz")
 
+        with self.lock:
+            return self.transcribe(pcm)
+
+    def transcribe(self, pcm: np.ndarray) -> Optional[str]:
+        """ Int16 → float32 [-1, 1] in one pass into the scratch buffer, then run Whisper (call with self.lock held) """
+        if self.scratch.size < pcm.size:
+            self.scratch = np.empty(pcm.size, dtype=np.float32)
+        x = self.scratch[:pcm.size]
+        np.multiply(pcm, np.float32(1.0 / 32768.0), out=x, dtype=np.float32)
+
         result = self.model.transcribe(
             x,
             temperature = (0.0, 0.2, 0.3), # Limit retries to 3 attempts (0.0, 0.2, 0.3), Default (0.0, 0.2, 0.4, 0.6, 0.8, 1.0)
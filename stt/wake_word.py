@@ -9,9 +9,12 @@ import webrtcvad
 # ---------------------------------
 
 import vosk
-import threading
+import numpy as np
 from collections import deque
 
+from stt.ring_buffer import PCMRingBuffer
+from utils.metrics import METRICS
+
 # Configuration
 from pathlib import Path
 import yaml
@@ -26,10 +29,17 @@ activation_phrase = cfg.get("wake_word", {}).get("activation_phrase", "ok robot"
 variants = cfg.get("wake_word", {}).get("variants", ["ok robot", "okay robot", "hey robot"])
 vad_aggressiveness = cfg.get("wake_word", {}).get("vad_aggressiveness", 3)
 required_hits = cfg.get("wake_word", {}).get("required_hits", 10)
+preroll_ms = cfg.get("wake_word", {}).get("preroll_ms", 1000)
+frame_ms = cfg.get("wake_word", {}).get("frame_ms", 10)
+vosk_gate = cfg.get("wake_word", {}).get("vosk_gate", True)
+energy_threshold = cfg.get("wake_word", {}).get("energy_threshold", 200)
+gate_hangover_ms = cfg.get("wake_word", {}).get("gate_hangover_ms", 300)
+reset_after_silence_ms = cfg.get("wake_word", {}).get("reset_after_silence_ms", 10000)
 min_silence_ms_to_drain = cfg.get("stt", {}).get("min_silence_ms_to_drain", 100)
 listen_seconds = cfg.get("stt", {}).get("listen_seconds", 5)
 sample_rate = cfg.get("audio_listener", {}).get("sample_rate", 16000)
 channels = cfg.get("audio_listener", {}).get("channels", 1)
+ring_utterances = cfg.get("stt", {}).get("ring_utterances", 4)
 
 
 # if AVATAR:
@@ -39,7 +49,7 @@ channels = cfg.get("audio_listener", {}).get("channels", 1)
 
 
 class WakeWord:
-    def __init__(self, model_path:str) -> None:
+    def __init__(self, model_path:str, frame_ms: int = frame_ms, gate: bool = vosk_gate) -> None:
 
         self.log = logging.getLogger("Wake_Word")     
         self.wake_word = activation_phrase
@@ -60,6 +70,8 @@ class WakeWord:
         
         self.model = vosk.Model(model_path)
         self.rec = vosk.KaldiRecognizer(self.model, self.sample_rate, grammar)
+        self.rec.SetWords(True) # Word timings in the final result, used to cut the wake phrase
+        self.wake_tokens = {tok for v in self.variants for tok in self.norm(v).split()}
 
         #Flags
         self.listening_confirm = False
@@ -72,67 +84,108 @@ class WakeWord:
 
         #VAD parameters
         # 10 ms → less latency (160 samples - 16 kHz)
+        # Larger chunks (frame_ms = 20, 30...) are read and fed to Vosk at once, VAD still runs on 10 ms sub-frames
+        if frame_ms < 10 or frame_ms % 10:
+            raise ValueError(f"frame_ms must be a multiple of 10, got {frame_ms}")
         self.vad = webrtcvad.Vad(vad_aggressiveness)  # Aggressiveness mode
-        self.frame_ms = 10
+        self.frame_ms = frame_ms
         self.frame_samples = int(self.sample_rate / 1000 * self.frame_ms)  # int16 mono
+        self.vad_bytes = int(self.sample_rate / 1000 * 10) * 2
 
         #Audio buffer for Output
-        self.lock = threading.Lock()
-        self.buffer = deque() 
-        self.size = 0
         self.max = int(self.listen_seconds * self.sample_rate * channels * 2) #2 bytes per int16 sample
         self.max_2 = int(1 * self.sample_rate * channels * 2) #2 bytes per int16 sample
+        # Preallocated, room for one frame over the limit (drained right after it is exceeded)
+        self.buffer = PCMRingBuffer(self.max + self.frame_samples * channels * 2, ring_utterances)
+
+        #Pre-roll: the last preroll_ms of audio is always kept, so the speech right after the
+        #wake phrase (before it is confirmed) reaches STT. Positions are bytes fed to Vosk,
+        #the same timeline as its word timings.
+        self.preroll = deque(maxlen=max(1, int(preroll_ms // self.frame_ms)))  # (position, frame)
+        self.stream_pos = 0     # Bytes fed to the recognizer so far
+        self.frame_pos = 0      # Position of the frame being processed
+        self.buffered_pos = []  # (position, length) of each buffered frame, until confirmation
+
+        #Gate: Vosk is only fed while there is speech (plus a hangover so word endings aren't clipped).
+        #Quiet chunks (RMS under energy_threshold) don't even go through the VAD.
+        self.gate = gate
+        self.energy_threshold = energy_threshold
+        self.silence_ms = 0        # Silence since the last speech sub-frame
+        self.vosk_active = False   # Vosk was fed since its last final result
 
         # #Initialize Avatar Server if needed
         # if AVATAR:
         #     subprocess.Popen([sys.executable, "-m", "avatar.avatar_server"], stdin=subprocess.DEVNULL, stdout = subprocess.PIPE, stderr = subprocess.PIPE, text=True)
         #     webbrowser.open(Path("avatar/OctoV.html").resolve().as_uri(), new=0, autoraise=True)
 
-    def wake_word_detector(self, frame: bytes) -> None | bytes:
-        """Process one 10 ms PCM int16 mono frame for wake-word detection."""
-        flag = True if self.vad.is_speech(frame, self.sample_rate) else False
+    @property
+    def size(self) -> int:
+        return len(self.buffer)
 
-        if (self.listening or self.listening_confirm) and flag: #If the system is listening or have a confirmation i save the info
-            drained = self.buffer_add(frame)  
-            if drained is not None:
-                # send_mode_sync(mode = "TTS", as_json=False) if AVATAR else None
-                return drained
-        
-        if not flag: # If I hear silence
-            if self.partial_hits > -self.silence_frames_to_drain:  # Count how much silence is saved
-                self.partial_hits -= 1         
-            if (self.listening or self.listening_confirm) and self.partial_hits <= -self.silence_frames_to_drain: #If is listening and the voice pass the umbral of silence
-                self.partial_hits = 0
-                # send_mode_sync(mode = "TTS", as_json=False) if AVATAR else None
-                if self.listening_confirm and self.size > 0: # If the wake_word is confirm and something is in the buffer
-                    return self.buffer_drain()
-                self.on_say("Detection wasn't confirmed, clearing buffer...")
-                self.buffer_clear()
-                return
-        
-        if self.rec.AcceptWaveform(frame): 
-            result = json.loads(self.rec.Result() or "{}")
-            text = (result.get("text") or "").lower().strip()
-            if text and self.matches_wake(text):
-                self.log.info(f"Wake word detected: '{text}'")
-                if not self.listening_confirm:           
-                    self.listening_confirm = True
-                    self.listening = True   
-                self.partial_hits = 0
-                return
-            self.partial_hits = 0
-
-        else:
+    def wake_word_detector(self, frame: bytes) -> None | memoryview:
+        """
+        Process one chunk of PCM int16 mono (frame_ms long) for wake-word detection.
+        VAD runs on each 10 ms sub-frame, Vosk is fed the whole chunk in one call.
+        """
+        view = memoryview(frame)
+        sub = self.vad_bytes
+        flags = self.speech_flags(frame) # Raw VAD: what is buffered and when the utterance ends
+        pos = self.stream_pos
+
+        for i, flag in enumerate(flags):
+            self.frame_pos = pos + i * sub
+            if (self.listening or self.listening_confirm) and flag: #If the system is listening or have a confirmation i save the info
+                drained = self.buffer_add(view[i * sub:(i + 1) * sub])
+                if drained is not None:
+                    # send_mode_sync(mode = "TTS", as_json=False) if AVATAR else None
+                    return drained
+
+            if not flag: # If I hear silence
+                if self.partial_hits > -self.silence_frames_to_drain:  # Count how much silence is saved
+                    self.partial_hits -= 1
+                if (self.listening or self.listening_confirm) and self.partial_hits <= -self.silence_frames_to_drain: #If is listening and the voice pass the umbral of silence
+                    self.partial_hits = 0
+                    # send_mode_sync(mode = "TTS", as_json=False) if AVATAR else None
+                    if self.listening_confirm and self.size > 0: # If the wake_word is confirm and something is in the buffer
+                        return self.buffer_drain()
+                    self.on_say("Detection wasn't confirmed, clearing buffer...")
+                    self.buffer_clear()
+                    return
+
+        # The gate also needs some energy, so quiet noise the VAD takes for speech doesn't wake Vosk up
+        voiced = any(flags) and not (self.energy_threshold and self.rms(frame) < self.energy_threshold)
+        self.silence_ms = 0 if voiced else self.silence_ms + self.frame_ms
+        if reset_after_silence_ms and self.silence_ms >= reset_after_silence_ms > self.silence_ms - self.frame_ms:
+            self.log.debug("Long silence, resetting the recognizer")
+            self.rec.Reset()
+            self.vosk_active = False
+            self.preroll.clear()
+
+        if self.gate and self.silence_ms > gate_hangover_ms:
+            if self.vosk_active: # Gate closing, get the result without waiting for Vosk's endpoint
+                self.vosk_active = False
+                self.final_result(json.loads(self.rec.FinalResult() or "{}"))
+            return
+        self.vosk_active = True
+
+        if self.accept_waveform(frame): 
+            self.vosk_active = False
+            self.final_result(json.loads(self.rec.Result() or "{}"))
+
+        elif len(flags) == 1 or any(flags): # Batched chunks only parse partials when there is speech
             partial = json.loads(self.rec.PartialResult() or "{}").get("partial", "").lower().strip()
             if partial:
                 if self.matches_wake(partial): #If something looks like a partial detection     
                     if not self.listening: 
                         self.listening = True
                         # send_mode_sync(mode = "USER", as_json=False) if AVATAR else None
-                        drained = self.buffer_add(frame) if flag else None
-                        if drained is not None:
-                            return drained
-                    self.partial_hits += 1
+                        for i, flag in enumerate(flags):
+                            if flag:
+                                self.frame_pos = pos + i * sub
+                                drained = self.buffer_add(view[i * sub:(i + 1) * sub])
+                                if drained is not None:
+                                    return drained
+                    self.partial_hits += len(flags) # Counted in 10 ms frames, whatever the chunk size
 
                     if self.partial_hits >= self.required_hits:
                         self.log.info(f"Partial Match: {partial!r}")
@@ -142,10 +195,74 @@ class WakeWord:
                     self.partial_hits = 0
 
     
-    def buffer_add(self, frame: bytes) -> None | bytes:
-        with self.lock:
-            self.buffer.append(frame)
-            self.size += len(frame)
+    def final_result(self, result: dict) -> None:
+        """ Handle a final Vosk result: confirm the wake word if it matches """
+        text = (result.get("text") or "").lower().strip()
+        if text and self.matches_wake(text):
+            self.log.info(f"Wake word detected: '{text}'")
+            if not self.listening_confirm:           
+                METRICS.mark("wake_detected")
+                self.listening_confirm = True
+                self.listening = True   
+                self.trim_wake_phrase(result.get("result") or [])
+        self.partial_hits = 0
+
+    def speech_flags(self, frame: bytes, threshold: float = 0) -> list:
+        """ VAD decision of each 10 ms sub-frame, all False without running the VAD when the RMS is under threshold (0 = always run it) """
+        view = memoryview(frame)
+        offsets = range(0, len(view), self.vad_bytes)
+        if threshold and self.rms(frame) < threshold:
+            return [False] * len(offsets)
+        return [self.vad.is_speech(view[i:i + self.vad_bytes], self.sample_rate) for i in offsets]
+
+    @staticmethod
+    def rms(frame: bytes) -> float:
+        """ RMS energy of int16 PCM """
+        x = np.frombuffer(frame, dtype=np.int16).astype(np.float32)
+        return float(np.sqrt(np.dot(x, x) / x.size)) if x.size else 0.0
+
+    def accept_waveform(self, frame: bytes) -> bool:
+        """ Feed one frame to Vosk, keeping it in the pre-roll """
+        self.preroll.append((self.stream_pos, frame))
+        self.stream_pos += len(frame)
+        return self.rec.AcceptWaveform(frame)
+
+    def trim_wake_phrase(self, words: list) -> None:
+        """
+        On confirmation, rebuild the buffer as the audio that follows the wake phrase: the
+        buffered speech plus the pre-roll frames that were not buffered, cut at the end time
+        Vosk gives for the last wake word. Without word timings the buffer is left as is.
+        """
+        ends = [w.get("end", 0.0) for w in words if self.norm(w.get("word", "")) in self.wake_tokens]
+        if not ends:
+            return
+        width = 2 * channels
+        cut = int(max(ends) * self.sample_rate) * width
+
+        # Rare (once per interaction), a plain copy is fine here. The trimmed audio is
+        # rewritten in place of the recorded one, so no ring space is lost.
+        recorded = bytes(self.buffer.peek())
+        self.buffer.clear()
+        frames, offset = [], 0
+        for pos, n in self.buffered_pos:
+            frames.append((pos, recorded[offset:offset + n]))
+            offset += n
+        frames.extend(self.preroll)
+        frames.sort(key=lambda f: f[0])
+
+        # Buffered sub-frames and pre-roll chunks can overlap, every byte is written once
+        self.buffered_pos = []
+        written = cut
+        for pos, frame in frames:
+            if pos + len(frame) > written:
+                self.buffer.write(frame[max(0, written - pos):])
+                written = pos + len(frame)
+        self.log.debug(f"Pre-roll: {self.size // width * 1000 // self.sample_rate} ms after the wake phrase kept")
+
+    def buffer_add(self, frame: bytes) -> None | memoryview:
+        self.buffer.write(frame)
+        if not self.listening_confirm:
+            self.buffered_pos.append((self.frame_pos, len(frame)))
         if self.size > self.max and self.listening_confirm:
             return self.buffer_drain()
         if self.size > self.max_2 and self.listening and not self.listening_confirm:
@@ -158,22 +275,19 @@ class WakeWord:
         """ Clear the audio buffer and reset flags. """
         self.listening = False
         self.listening_confirm = False
-        with self.lock:
-            self.buffer.clear()
-            self.size = 0
+        self.buffer.clear()
+        self.buffered_pos = []
     
-    def buffer_drain(self) -> bytes:
+    def buffer_drain(self) -> memoryview:
         """
-        Return all buffered audio (as a single bytes object) and clear the buffer.
-        Operates atomically under `self.lock`.
+        Return all buffered audio (as a contiguous view of the ring buffer, no copy) and clear the buffer.
+        The view can be overwritten by the next utterances: copy it before handing it to another thread.
         """
         self.log.info("Audio sent to STT")
+        METRICS.mark("buffer_drained")
 
-        with self.lock:
-            data = b"".join(self.buffer)
-            self.buffer.clear()
-
-        self.size = 0
+        data = self.buffer.drain()
+        self.buffered_pos = []
         self.listening = False
         self.listening_confirm = False
         return data
@@ -0,0 +1,55 @@
+import hashlib
+
+import numpy as np
+import pytest
+
+from tts.audio_bank import AudioBank, write_bank
+
+
+def entry(i: int):
+    key = hashlib.sha256(f"answer {i}".encode()).hexdigest()
+    pcm = np.random.default_rng(i).integers(-3000, 3000, 1000 + 37 * i, dtype=np.int16)
+    return key, pcm
+
+
+def test_streamed_entries_round_trip(tmp_path):
+    path = tmp_path / "bank"
+    audio = dict(entry(i) for i in range(20))
+    consumed = []
+
+    def rendered():
+        for key, pcm in audio.items():
+            consumed.append(key)
+            yield key, pcm.tobytes()
+
+    assert write_bank(path, 22050, len(audio), rendered()) == 20
+    bank = AudioBank.open(path)
+    assert bank.sample_rate == 22050 and len(bank) == 20
+    for key, pcm in audio.items():
+        assert np.array_equal(bank.get(key), pcm)
+    assert consumed == list(audio) # Pulled lazily, one entry at a time
+
+
+def test_fewer_entries_than_reserved(tmp_path):
+    path = tmp_path / "bank"
+    key, pcm = entry(1)
+    assert write_bank(path, 16000, 5, [(key, pcm.tobytes())]) == 1
+    bank = AudioBank.open(path)
+    assert len(bank) == 1 and np.array_equal(bank.get(key), pcm)
+
+
+def test_failed_build_keeps_the_previous_bank(tmp_path):
+    path = tmp_path / "bank"
+    key, pcm = entry(1)
+    write_bank(path, 16000, 1, [(key, pcm.tobytes())])
+
+    def failing():
+        yield entry(2)[0], entry(2)[1].tobytes()
+        raise RuntimeError("worker died")
+
+    with pytest.raises(RuntimeError):
+        write_bank(path, 16000, 2, failing())
+    with pytest.raises(ValueError):
+        write_bank(path, 16000, 1, [(k, p.tobytes()) for k, p in map(entry, range(2))])
+    assert not (tmp_path / "bank.tmp").exists()
+    assert np.array_equal(AudioBank.open(path).get(key), pcm)
@@ -0,0 +1,51 @@
+import os
+
+import numpy as np
+
+from tts.audio_cache import AudioCache
+
+MB = 1024 * 1024
+
+
+def clip(seed: int, nbytes: int = MB // 4) -> np.ndarray:
+    return np.random.default_rng(seed).integers(-3000, 3000, nbytes // 2, dtype=np.int16)
+
+
+def set_age(cache: AudioCache, key: str, seconds_ago: int) -> None:
+    path = cache.dir / f"{key}.pcm"
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns - seconds_ago * 10**9))
+
+
+def test_disk_is_kept_under_max_disk_mb_by_evicting_the_oldest(tmp_path):
+    cache = AudioCache(max_items=0, directory=str(tmp_path), max_disk_mb=1) # 4 clips of 1/4 MB fit
+    for i in range(4):
+        cache.put(f"k{i}", clip(i))
+        set_age(cache, f"k{i}", 100 - i) # k0 is the oldest
+    assert cache.get("k1") is not None # Disk hit, k1 becomes the most recently used
+
+    cache.put("k4", clip(4))
+    names = sorted(p.stem for p in tmp_path.glob("*.pcm"))
+    assert names == ["k1", "k2", "k3", "k4"]
+    assert cache.disk_bytes <= MB
+
+    set_age(cache, "k2", 50)
+    cache.put("k5", clip(5))
+    assert sorted(p.stem for p in tmp_path.glob("*.pcm")) == ["k1", "k3", "k4", "k5"]
+    assert np.array_equal(cache.get("k5"), clip(5))
+
+
+def test_a_lower_limit_trims_the_directory_at_startup(tmp_path):
+    cache = AudioCache(max_items=0, directory=str(tmp_path))
+    for i in range(4):
+        cache.put(f"k{i}", clip(i))
+        set_age(cache, f"k{i}", 100 - i)
+    AudioCache(max_items=0, directory=str(tmp_path), max_disk_mb=0.5)
+    assert sorted(p.stem for p in tmp_path.glob("*.pcm")) == ["k2", "k3"]
+
+
+def test_unbounded_by_default(tmp_path):
+    cache = AudioCache(max_items=0, directory=str(tmp_path))
+    for i in range(6):
+        cache.put(f"k{i}", clip(i))
+    assert len(list(tmp_path.glob("*.pcm"))) == 6
@@ -0,0 +1,20 @@
+from rapidfuzz import fuzz
+
+from fuzzy_search.benchmark import noisy_queries, settings
+from fuzzy_search.fuzzy_search import GENERAL_QA, fuzzy_logic_accuracy_general, path_general
+from fuzzy_search.normalize_text import norm_text
+
+
+def test_miss_reports_the_best_score_under_the_threshold():
+    """ score_cutoff prunes the scan, but a miss still returns its near-miss score (used to tune the threshold) """
+    with settings(use_snapshot=False, cache_size=0, scoring_mode="ratio"):
+        app = GENERAL_QA(path_general)
+    queries = [q for q, _ in noisy_queries(400)] + ["zzz qqq", "hola que tal el clima"]
+    misses = 0
+    for q, many in zip(queries, app.lookup_many(queries)):
+        n = norm_text(q, False)
+        expected = round(max(fuzz.ratio(n, t) for t in app.triggers) / 100.0, 3)
+        assert app.lookup(q)["score"] == expected, q
+        assert many["score"] == expected, q
+        misses += expected < fuzzy_logic_accuracy_general
+    assert misses > 0
@@ -0,0 +1,44 @@
+import json
+import random
+
+import pytest
+
+from fuzzy_search.benchmark import asr_noise, noisy_queries, settings, synthetic_kb
+from fuzzy_search.fuzzy_search import GENERAL_QA
+
+
+@pytest.fixture(scope="module")
+def kb(tmp_path_factory):
+    """ Synthetic KB (real triggers + filler) and noisy queries on its triggers """
+    data = synthetic_kb(5000)
+    path = tmp_path_factory.mktemp("kb") / "general_QA.json"
+    path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+
+    rng = random.Random(7)
+    triggers = [t for lst in data.values() for it in lst for t in it["triggers"]]
+    queries = [q for q, _ in noisy_queries(300)] + [asr_noise(rng.choice(triggers), rng) for _ in range(300)]
+    queries += ["", "zzzz", "que"] # No hit / very short queries
+    return str(path), queries
+
+
+def load(path: str, with_index: bool, max_share: float = 0.02) -> GENERAL_QA:
+    # A small top_k makes the index fall back to the full scan often, both branches are exercised
+    with settings(use_rapidfuzz=True, use_ngram_index=with_index, ngram_top_k=5, ngram_max_share=max_share,
+                  use_snapshot=False, cache_size=0, watch_interval=0):
+        return GENERAL_QA(path)
+
+
+@pytest.mark.parametrize("max_share", [0.02, 1.0]) # Common n-grams skipped / every posting list walked
+def test_index_keeps_the_full_scan_best_hit(kb, max_share):
+    path, queries = kb
+    full, pruned = load(path, False), load(path, True, max_share)
+    assert full.index is None and pruned.index is not None
+    for q in queries:
+        assert pruned.lookup(q) == full.lookup(q), q
+
+
+def test_index_keeps_the_full_scan_topk(kb):
+    path, queries = kb
+    full, pruned = load(path, False), load(path, True)
+    for q in queries[::3]:
+        assert pruned.lookup_topk(q, k=3) == full.lookup_topk(q, k=3), q
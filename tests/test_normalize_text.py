@@ -0,0 +1,13 @@
+from fuzzy_search.benchmark import load_seed_kb, random_unicode_texts, reference_norm_text
+from fuzzy_search.normalize_text import _norm_text, norm_text
+
+
+def test_norm_text_matches_the_reference():
+    """ Byte-identical to the original regex implementation, on the KB and random Unicode """
+    seed_kb = load_seed_kb()
+    texts = [t for trigs, _ in seed_kb for t in trigs] + [ans for _, ans in seed_kb] + random_unicode_texts(20000)
+    for courtesy in (False, True):
+        mismatches = [t for t in texts if norm_text(t, courtesy) != reference_norm_text(t, courtesy)]
+        assert mismatches == [], f"courtesy={courtesy}: {mismatches[:5]!r}"
+        # Memoized and direct paths agree too
+        assert all(_norm_text(t, courtesy) == norm_text(t, courtesy) for t in texts[:2000])
@@ -0,0 +1,55 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from fuzzy_search.benchmark import settings
+from fuzzy_search.fuzzy_search import GENERAL_QA
+
+OLD = {"knowledge": [
+    {"triggers": ["como te llamas", "cual es tu nombre"], "answer": "Me llamo Octybot"},
+    {"triggers": ["que hora es"], "answer": "No tengo reloj"},
+]}
+NEW = {"knowledge": [
+    {"triggers": ["como te llamas"], "answer": "Ahora me llamo Robotina"},
+    {"triggers": ["cuentame un chiste"], "answer": "Un chiste"},
+]}
+
+
+def write(path: Path, data) -> None:
+    path.write_text(data if isinstance(data, str) else json.dumps(data, ensure_ascii=False), encoding="utf-8")
+
+
+@pytest.fixture
+def app(tmp_path):
+    path = tmp_path / "general_QA.json"
+    write(path, OLD)
+    with settings(use_snapshot=False, cache_size=16, cache_ttl=0, watch_interval=0):
+        yield GENERAL_QA(str(path))
+
+
+def test_reload_swaps_in_the_new_kb(app):
+    assert app.lookup("cuentame un chiste")["answer"] == ""
+    write(Path(app.path), NEW)
+    app.reload(background=False)
+    assert len(app) == 2
+    assert app.lookup("cuentame un chiste")["answer"] == "Un chiste"
+    assert app.lookup("que hora es")["answer"] == ""
+
+
+@pytest.mark.parametrize("content", ["", "{}", '{"knowledge": [{"triggers": ["a"', "no es json"])
+def test_reload_keeps_the_old_kb_when_the_new_one_is_empty_or_broken(app, content):
+    kb = app.kb
+    write(Path(app.path), content)
+    app.reload(background=False)
+    assert app.kb is kb
+    assert app.lookup("que hora es")["answer"] == "No tengo reloj"
+
+
+def test_reload_clears_the_query_cache(app):
+    assert app.lookup("como te llamas")["answer"] == "Me llamo Octybot"
+    assert app.cache.stats()["size"] == 1
+    write(Path(app.path), NEW)
+    app.reload(background=False)
+    assert app.cache.stats()["size"] == 0
+    assert app.lookup("como te llamas")["answer"] == "Ahora me llamo Robotina"
@@ -0,0 +1,72 @@
+import random
+
+import pytest
+
+from stt.ring_buffer import PCMRingBuffer
+
+
+def frames(rng: random.Random, n: int, size: int) -> list:
+    return [bytes(rng.randrange(256) for _ in range(size)) for _ in range(n)]
+
+
+def test_drained_bytes_match_what_was_written_across_the_wrap():
+    rng = random.Random(0)
+    rb = PCMRingBuffer(max_bytes=64, slots=2) # 128 bytes, wraps every couple of utterances
+    wrapped = 0
+    for _ in range(50):
+        utterance = frames(rng, rng.randint(1, 6), 10)
+        before = rb.end
+        for frame in utterance:
+            assert bytes(rb.write(frame)) == frame
+        wrapped += rb.start < before # The utterance was moved to the start
+        assert bytes(rb.peek()) == b"".join(utterance)
+        assert bytes(rb.drain()) == b"".join(utterance)
+        assert len(rb) == 0
+    assert wrapped > 0
+
+
+def test_wrap_moves_the_partial_utterance_to_the_start():
+    rb = PCMRingBuffer(max_bytes=8, slots=2) # 16 bytes
+    rb.write(b"a" * 12)
+    rb.drain()
+    rb.write(b"bb")
+    rb.write(b"cccc") # 14 + 4 > 16: "bb" moves to the start first
+    assert rb.start == 0
+    assert bytes(rb.drain()) == b"bbcccc"
+
+
+def test_drained_view_is_in_place_and_valid_until_the_buffer_wraps():
+    rb = PCMRingBuffer(max_bytes=8, slots=2)
+    rb.write(b"12345678")
+    view = rb.drain()
+    assert view.obj is rb.buf # No copy
+    copy = bytes(view)
+
+    rb.write(b"abcd") # Written after it, the view is untouched
+    assert bytes(view) == b"12345678"
+    rb.write(b"efgh") # 8 + 4 + 4 = 16, still fits
+    assert bytes(view) == b"12345678"
+
+    rb.drain()
+    rb.write(b"XXXXXXXX") # Wraps over the oldest region, where the view points
+    assert bytes(view) != copy
+    assert copy == b"12345678" # A copy taken when draining is what other threads must keep
+
+
+def test_clear_discards_the_current_utterance():
+    rb = PCMRingBuffer(max_bytes=8)
+    rb.write(b"abc")
+    rb.clear()
+    assert len(rb) == 0
+    rb.write(b"de")
+    assert bytes(rb.drain()) == b"de"
+
+
+def test_overflow_raises_and_keeps_the_recorded_audio():
+    rb = PCMRingBuffer(max_bytes=8, slots=2) # 16 bytes
+    rb.write(b"x" * 12)
+    with pytest.raises(ValueError):
+        rb.write(b"y" * 5)
+    assert bytes(rb.peek()) == b"x" * 12
+    rb.write(b"y" * 4) # Exactly full
+    assert bytes(rb.drain()) == b"x" * 12 + b"y" * 4
@@ -0,0 +1,100 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from fuzzy_search import snapshot
+from fuzzy_search.benchmark import noisy_queries, settings, synthetic_kb
+from fuzzy_search.fuzzy_search import GENERAL_QA, ngram_top_k
+from fuzzy_search.snapshot import read_snapshot, snapshot_path
+
+N = 3
+
+
+@pytest.fixture
+def kb_path(tmp_path):
+    path = tmp_path / "general_QA.json"
+    path.write_text(json.dumps(synthetic_kb(2000), ensure_ascii=False), encoding="utf-8")
+    return path
+
+
+def load(path) -> GENERAL_QA:
+    with settings(use_rapidfuzz=True, use_ngram_index=True, ngram_size=N, use_snapshot=True, cache_size=0, watch_interval=0):
+        return GENERAL_QA(str(path))
+
+
+def read(path):
+    return read_snapshot(str(path), N, ngram_top_k)
+
+
+def test_round_trip(kb_path):
+    built = load(kb_path).kb
+    assert snapshot_path(str(kb_path)).exists()
+    snap = read(kb_path)
+    assert snap is not None
+    assert snap.triggers == built.triggers
+    assert snap.answers == built.answers
+    assert list(snap.answer_ids) == list(built.answer_ids)
+    assert snap.categories == built.categories
+    assert list(snap.category_ids) == list(built.category_ids)
+    assert snap.index.postings.keys() == built.index.postings.keys()
+    for gram, (ids, counts) in built.index.postings.items():
+        assert np.array_equal(snap.index.postings[gram][0], ids)
+        assert np.array_equal(snap.index.postings[gram][1], counts)
+
+    # A second load maps the snapshot and answers exactly like the JSON build
+    loaded = load(kb_path)
+    queries = [q for q, _ in noisy_queries(100)]
+    with settings(use_snapshot=False, use_ngram_index=True, cache_size=0):
+        fresh = GENERAL_QA(str(kb_path))
+    assert [loaded.lookup(q) for q in queries] == [fresh.lookup(q) for q in queries]
+
+
+def test_touched_source_with_the_same_content_stays_valid(kb_path):
+    load(kb_path)
+    st = os.stat(kb_path)
+    os.utime(kb_path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert read(kb_path) is not None # mtime differs, the content hash still matches
+
+
+def test_changed_source_invalidates(kb_path):
+    load(kb_path)
+    data = json.loads(kb_path.read_text(encoding="utf-8"))
+    data["knowledge"][0]["triggers"].append("una pregunta nueva")
+    kb_path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+    assert read(kb_path) is None
+    assert "una pregunta nueva" in load(kb_path).triggers
+
+
+def test_digest_mismatch_invalidates(kb_path):
+    load(kb_path)
+    st = os.stat(kb_path)
+    raw = kb_path.read_bytes()
+    i = raw.index(b'"answer": "') + len(b'"answer": "')
+    kb_path.write_bytes(raw[:i] + (b"X" if raw[i:i+1] != b"X" else b"Y") + raw[i+1:]) # Same size
+    os.utime(kb_path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert read(kb_path) is None
+
+
+def test_normalizer_change_invalidates(kb_path, monkeypatch):
+    load(kb_path)
+    monkeypatch.setattr(snapshot, "normalizer_tag", lambda: b"\xff" * 8)
+    assert read(kb_path) is None
+
+
+@pytest.mark.parametrize("damage", ["truncated", "corrupt"])
+def test_damaged_snapshot_falls_back_to_json(kb_path, damage):
+    expected = load(kb_path).kb
+    snap_file = snapshot_path(str(kb_path))
+    raw = snap_file.read_bytes()
+    if damage == "truncated":
+        snap_file.write_bytes(raw[:len(raw) // 2])
+    else:
+        snap_file.write_bytes(raw[:snapshot.HEADER.size] + b"\xff" * (len(raw) - snapshot.HEADER.size))
+    assert read(kb_path) is None
+
+    app = load(kb_path)
+    assert app.triggers == expected.triggers
+    assert app.kb.answers == expected.answers
+    assert read(kb_path) is not None # Rewritten from the JSON
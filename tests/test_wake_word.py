@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+import stt.wake_word as wake_word_module
+from stt.wake_word import WakeWord
+
+
+class FakeRecognizer:
+    """ Vosk recognizer that never hears anything, the tests drive the state by hand """
+
+    def __init__(self, *args):
+        pass
+
+    def SetWords(self, enabled):
+        pass
+
+    def AcceptWaveform(self, frame):
+        return False
+
+    def PartialResult(self):
+        return '{"partial": ""}'
+
+    def Result(self):
+        return "{}"
+
+    def FinalResult(self):
+        return "{}"
+
+    def Reset(self):
+        pass
+
+
+class FakeVad:
+    """ Speech is any non-silent sub-frame, however quiet """
+
+    def is_speech(self, frame, rate):
+        return any(bytes(frame))
+
+
+@pytest.fixture
+def ww(monkeypatch):
+    monkeypatch.setattr(wake_word_module.vosk, "Model", lambda path: None)
+    monkeypatch.setattr(wake_word_module.vosk, "KaldiRecognizer", FakeRecognizer)
+    ww = WakeWord("unused", frame_ms=10)
+    ww.vad = FakeVad()
+    return ww
+
+
+def frame(level: int, n: int = 160) -> bytes:
+    return np.full(n, level, dtype=np.int16).tobytes()
+
+
+def test_quiet_speech_stays_in_the_utterance(ww):
+    """ The energy threshold only gates Vosk: speech under it is still buffered and doesn't end the utterance """
+    assert ww.energy_threshold > 50
+    ww.listening = ww.listening_confirm = True # Wake word already confirmed
+
+    loud, quiet = frame(3000), frame(50)
+    frames = [loud] * 20 + [quiet] * (ww.silence_frames_to_drain + 10) + [loud] * 20
+    utterance = None
+    for f in frames:
+        assert ww.wake_word_detector(f) is None
+    for _ in range(3 * ww.silence_frames_to_drain): # Silence until the utterance is drained
+        utterance = ww.wake_word_detector(frame(0))
+        if utterance is not None:
+            break
+
+    assert utterance is not None
+    assert bytes(utterance) == b"".join(frames)
+
+
+def test_quiet_speech_doesnt_open_the_vosk_gate(ww):
+    calls = []
+    ww.rec.AcceptWaveform = lambda f: calls.append(f) or False
+    for _ in range(100):
+        ww.wake_word_detector(frame(50))
+    fed_while_quiet = len(calls)
+    ww.wake_word_detector(frame(3000))
+    assert fed_while_quiet * ww.frame_ms <= wake_word_module.gate_hangover_ms + ww.frame_ms
+    assert len(calls) == fed_while_quiet + 1
@@ -0,0 +1,169 @@
+"""
+Packed audio bank of the knowledge base answers.
+
+    python -m tts.audio_bank [--workers 4] [--out config/data/general_QA.audiobank]
+
+Every distinct answer of general_QA.json (plus the "no answer" reply) is synthesized with the
+configured Piper voice in a process pool and packed into one file. At runtime TTS maps it and
+plays answers straight from the mapping: no synthesis and no per-answer file.
+"""
+import logging
+import mmap
+import os
+import struct
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+#------------------------ Audio bank file ------------------------#
+# Binary layout (little endian):
+#   header -> magic, version, sample rate, number of entries, offset of the PCM section
+#   index  -> per entry: audio key (sha256, see text_to_speech.audio_key), first sample, number of samples
+#   pcm    -> int16 mono audio of every entry, back to back, starting on an 8-byte boundary
+# Keys already cover the voice model and synthesis settings, a bank built for another voice just misses.
+
+MAGIC = b"TTSB"
+VERSION = 1
+HEADER = struct.Struct("<4sIIIQ")
+ENTRY = struct.Struct("<32sQQ")
+
+log = logging.getLogger("TTS")
+
+
+class AudioBank:
+    """ Read-only view of a packed audio bank, answers are returned as zero-copy slices of the mapping """
+
+    def __init__(self, path: Path, mm: mmap.mmap, sample_rate: int, index: Dict[str, Tuple[int, int]], pcm_offset: int):
+        self.path = path
+        self.mm = mm
+        self.sample_rate = sample_rate
+        self.index = index
+        self.pcm_offset = pcm_offset
+
+    @classmethod
+    def open(cls, path: Path) -> Optional["AudioBank"]:
+        """ Map the bank at path, None when there is none (or it can't be read) """
+        path = Path(path)
+        if not path.exists():
+            return None
+        try:
+            with open(path, "rb") as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, rate, n, pcm_offset = HEADER.unpack_from(mm, 0)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"not an audio bank v{VERSION}")
+            index = {}
+            for i in range(n):
+                key, start, length = ENTRY.unpack_from(mm, HEADER.size + i * ENTRY.size)
+                index[key.hex()] = (start, length)
+        except (OSError, ValueError, struct.error) as e:
+            log.warning(f"Audio bank {path} ignored: {e}")
+            return None
+        log.info(f"Audio bank loaded: {n} answers")
+        return cls(path, mm, rate, index, pcm_offset)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """ int16 audio for an audio key (view into the mapping), or None """
+        entry = self.index.get(key)
+        if entry is None:
+            return None
+        start, length = entry
+        return np.frombuffer(self.mm, dtype="<i2", count=length, offset=self.pcm_offset + 2 * start)
+
+
+def write_bank(path: Path, sample_rate: int, n_entries: int, entries: Iterable[Tuple[str, bytes]]) -> int:
+    """
+    Pack (audio key, int16 PCM bytes) entries into path, atomically, and return how many were written.
+    Room for n_entries index records is reserved up front, so each PCM goes to the file as soon as
+    `entries` yields it and only the index is kept in memory.
+    """
+    pcm_offset = HEADER.size + n_entries * ENTRY.size
+    pcm_offset += (-pcm_offset) % 8
+    tmp = Path(f"{path}.tmp")
+    index: List[bytes] = []
+    try:
+        with open(tmp, "wb") as f:
+            f.seek(pcm_offset)
+            start = 0
+            for key, pcm in entries:
+                if len(index) == n_entries:
+                    raise ValueError(f"More than the {n_entries} entries reserved in the audio bank")
+                f.write(pcm)
+                index.append(ENTRY.pack(bytes.fromhex(key), start, len(pcm) // 2))
+                start += len(pcm) // 2
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, VERSION, sample_rate, len(index), pcm_offset))
+            f.write(b"".join(index))
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    os.replace(tmp, path)
+    return len(index)
+
+
+#------------------------ Build (process pool) ------------------------#
+_voice = None
+_config = None
+
+
+def _init_worker(model_path: str, config_path: str) -> None:
+    """ Load the voice once per worker process """
+    global _voice, _config
+    from piper.voice import PiperVoice
+    from tts.text_to_speech import synthesis_config
+    _voice = PiperVoice.load(model_path=model_path, config_path=config_path)
+    _config = synthesis_config()
+
+
+def _render(text: str) -> bytes:
+    return b"".join(chunk.audio_int16_bytes for chunk in _voice.synthesize(text, syn_config=_config))
+
+
+def build_bank(texts: List[str], model_path: str, config_path: str, out: Path, workers: int | None = None) -> int:
+    """
+    Synthesize every text with a pool of `workers` processes (one per core by default) into the bank at out.
+    Each answer is written to the bank as soon as its worker returns it, so the build holds only the
+    answers in flight, not the whole bank.
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    from tts.text_to_speech import audio_key, sample_rate, synthesis_config, voice_identity
+
+    texts = sorted(set(t for t in texts if t))
+    voice_id, config = voice_identity(model_path), synthesis_config()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(model_path, config_path)) as pool:
+        pending = {pool.submit(_render, text): text for text in texts}
+
+        def rendered():
+            for future in as_completed(pending):
+                text = pending.pop(future) # as_completed drops its own reference once yielded
+                yield audio_key(text, voice_id, config), future.result()
+
+        return write_bank(out, sample_rate, len(texts), rendered())
+
+
+#------------------------ CLI ------------------------#
+if "__main__" == __name__:
+    import argparse
+    import time
+
+    from utils.utils import LoadModel, configure_logging
+    from fuzzy_search.fuzzy_search import GENERAL_QA, path_general
+    from tts.text_to_speech import BASE_DIR, audio_bank_path, cfg
+
+    configure_logging()
+    parser = argparse.ArgumentParser(description="Pre-render every knowledge base answer into a packed audio bank")
+    parser.add_argument("--workers", type=int, default=None, help="Processes (default: one per core)")
+    parser.add_argument("--out", default=str(BASE_DIR / audio_bank_path))
+    args = parser.parse_args()
+
+    model = LoadModel()
+    voice_id, decoder = model.voice_pair(cfg.get("tts", {}).get("voice", 1))
+    texts = GENERAL_QA(path_general).answers + ["No se encontró una respuesta adecuada"]
+
+    start = time.perf_counter()
+    n = build_bank(texts, str(model.ensure_model("tts")[voice_id]), str(model.ensure_model("tts")[decoder]), Path(args.out), args.workers)
+    print(f"{n} answers rendered into {args.out} ({os.path.getsize(args.out) / 1e6:.1f} MB) in {time.perf_counter() - start:.1f} s")
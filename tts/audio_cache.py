@@ -0,0 +1,154 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+class AudioCache:
+    """
+    Two-level cache of synthesized speech (int16 mono PCM).
+
+    Level 1 is a bounded in-memory LRU of arrays. Level 2 is a directory of raw `.pcm` files,
+    one per key, read back with np.memmap so a hit costs a page-in instead of a Piper run;
+    the mapped array is then kept in level 1. Keys are built by `key()` from the text and
+    everything that changes the audio (voice model, synthesis settings), so changing any of
+    them just misses instead of serving stale audio. With max_disk_mb > 0 the directory is
+    kept under that size by deleting the least recently used files (by mtime, a disk hit
+    touches its file).
+    """
+
+    def __init__(self, max_items: int = 64, directory: str = "", max_disk_mb: float = 0):
+        self.log = logging.getLogger("TTS")
+        self.max_items = max_items
+        self.dir = Path(directory).expanduser() if directory else None
+        if self.dir is not None:
+            try:
+                self.dir.mkdir(parents=True, exist_ok=True)
+            except OSError as e:
+                self.log.warning(f"Audio cache directory {self.dir} unusable ({e}), caching in memory only")
+                self.dir = None
+        self.lock = threading.Lock()
+        self.entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.max_disk_bytes = int(max_disk_mb * 1024 * 1024)
+        self.disk_lock = threading.Lock()
+        self.disk_bytes = sum(size for _, size, _ in self._pcm_files())
+        if self.max_disk_bytes > 0 and self.disk_bytes > self.max_disk_bytes: # e.g. the limit was lowered
+            with self.disk_lock:
+                self._evict()
+
+    @staticmethod
+    def key(text: str, voice: Dict[str, Any], config: Dict[str, Any]) -> str:
+        """ Stable hash of the text, the voice identity and the synthesis settings """
+        blob = json.dumps({"text": text, "voice": voice, "config": config}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """ int16 audio for key, or None """
+        with self.lock:
+            audio = self.entries.get(key)
+            if audio is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return audio
+
+        path = self.dir / f"{key}.pcm" if self.dir is not None else None
+        if path is None or not path.exists() or path.stat().st_size == 0:
+            with self.lock:
+                self.misses += 1
+            return None
+        try:
+            audio = np.memmap(path, dtype=np.int16, mode="r")
+        except (OSError, ValueError) as e:
+            self.log.warning(f"Unreadable cached audio {path.name}: {e}")
+            with self.lock:
+                self.misses += 1
+            return None
+        try:
+            os.utime(path) # Recently used, evicted last
+        except OSError:
+            pass
+        with self.lock:
+            self.disk_hits += 1
+            self._remember(key, audio)
+        return audio
+
+    def put(self, key: str, audio: np.ndarray) -> None:
+        """ Store int16 audio in memory and, when a directory is set, on disk (atomically) """
+        audio = np.ascontiguousarray(audio, dtype=np.int16)
+        if audio.size == 0:
+            return
+        with self.lock:
+            self._remember(key, audio)
+        if self.dir is None:
+            return
+        path = self.dir / f"{key}.pcm"
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            audio.tofile(tmp)
+            os.replace(tmp, path)
+        except OSError as e:
+            self.log.warning(f"Could not write cached audio {path.name}: {e}")
+            tmp.unlink(missing_ok=True)
+            return
+        with self.disk_lock:
+            self.disk_bytes += audio.nbytes
+            if self.max_disk_bytes > 0 and self.disk_bytes > self.max_disk_bytes:
+                self._evict(keep=path)
+
+    def _pcm_files(self) -> List[Tuple[int, int, Path]]:
+        """ (mtime_ns, size, path) of the cached .pcm files, oldest first """
+        if self.dir is None:
+            return []
+        files = []
+        try:
+            with os.scandir(self.dir) as it:
+                for entry in it:
+                    if entry.name.endswith(".pcm"):
+                        try:
+                            st = entry.stat()
+                        except OSError: # Deleted meanwhile
+                            continue
+                        files.append((st.st_mtime_ns, st.st_size, Path(entry.path)))
+        except OSError as e:
+            self.log.warning(f"Could not list the audio cache directory {self.dir}: {e}")
+        return sorted(files)
+
+    def _evict(self, keep: Optional[Path] = None) -> None:
+        """ Delete the oldest files until the directory fits in max_disk_bytes (caller holds disk_lock) """
+        files = self._pcm_files()
+        total = sum(size for _, size, _ in files)
+        for _, size, path in files:
+            if total <= self.max_disk_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                path.unlink() # A memmap still reading it keeps its pages
+                total -= size
+            except OSError as e:
+                self.log.warning(f"Could not evict cached audio {path.name}: {e}")
+        self.disk_bytes = total
+
+    def _remember(self, key: str, audio: np.ndarray) -> None:
+        if self.max_items <= 0:
+            return
+        self.entries[key] = audio
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_items:
+            self.entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            total = self.hits + self.disk_hits + self.misses
+            return {"size": len(self.entries), "max_size": self.max_items, "hits": self.hits,
+                    "disk_hits": self.disk_hits, "misses": self.misses, "disk_mb": round(self.disk_bytes / 2**20, 1),
+                    "hit_rate": round((self.hits + self.disk_hits) / total, 3) if total else 0.0}
@@ -0,0 +1,98 @@
+"""
+Offline benchmarks for the audio output.
+
+    python -m tts.benchmark playback [--runs 20] [--null]
+
+playback: time from asking TTS to play an answer to its first chunk being accepted by the
+output, with a stream opened per answer and with the persistent stream. Run it against a
+loopback or null device (e.g. `pactl load-module module-null-sink` or snd-aloop as the default
+output) to include the device-open cost; --null uses NullAudioSink, which only shows the
+hand-off cost of the writer thread.
+"""
+import argparse
+import time
+from typing import List
+
+import numpy as np
+
+from utils.utils import LoadModel
+from tts.null_sink import NullAudioSink
+from tts.text_to_speech import TTS, cfg, sample_rate
+
+
+def tone(seconds: float = 0.5, freq: float = 220.0) -> np.ndarray:
+    """ int16 sine at the TTS sample rate, standing in for an answer """
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    return (3000 * np.sin(2 * np.pi * freq * t)).astype(np.int16)
+
+
+class FirstWrite:
+    """ Output stream wrapper recording when the first write of an answer has been accepted """
+
+    def __init__(self):
+        self.stream = None
+        self.first: float | None = None
+
+    def wrap(self, stream) -> "FirstWrite":
+        self.stream = stream
+        return self
+
+    def write(self, data: bytes) -> None:
+        self.stream.write(data)
+        if self.first is None:
+            self.first = time.perf_counter()
+
+    def stop_stream(self) -> None:
+        self.stream.stop_stream()
+
+    def close(self) -> None:
+        self.stream.close()
+
+
+def bench_playback_run(tts: TTS, audio: np.ndarray, runs: int) -> List[float]:
+    """ ms from play_audio_with_amplitude() to the first chunk accepted by the output, over runs answers """
+    probe = FirstWrite()
+    if tts.writer is not None: # Already open, written by the writer thread
+        tts.writer.stream = tts.stream = probe.wrap(tts.writer.stream)
+    else:
+        open_output = tts.open_output
+        tts.open_output = lambda: probe.wrap(open_output())
+
+    out = []
+    for _ in range(runs):
+        probe.first = None
+        start = time.perf_counter()
+        tts.play_audio_with_amplitude(audio)
+        out.append((probe.first - start) * 1000 if probe.first else float("nan"))
+    return out
+
+
+def bench_playback(runs: int, null: bool) -> None:
+    model = LoadModel()
+    voice_id, decoder = model.voice_pair(cfg.get("tts", {}).get("voice", 1))
+    paths = str(model.ensure_model("tts")[voice_id]), str(model.ensure_model("tts")[decoder])
+    audio = tone()
+    print(f"{runs} answers of {len(audio) / sample_rate:.1f} s on {'NullAudioSink' if null else 'the default output device'}")
+    for persistent in (False, True):
+        sink = NullAudioSink(sample_rate) if null else None
+        tts = TTS(*paths, sink=sink, persistent=persistent)
+        try:
+            v = np.array(bench_playback_run(tts, audio, runs))
+        finally:
+            tts.terminate()
+        name = "persistent stream" if persistent else "stream per answer"
+        print(f"{name:<18}: playback start mean {np.nanmean(v):7.2f} ms | p50 {np.nanpercentile(v, 50):7.2f} ms | "
+              f"p95 {np.nanpercentile(v, 95):7.2f} ms | max {np.nanmax(v):7.2f} ms")
+
+
+#------------------------ CLI ------------------------#
+if "__main__" == __name__:
+    parser = argparse.ArgumentParser(description="Audio output benchmarks")
+    sub = parser.add_subparsers(dest="bench", required=True)
+    p = sub.add_parser("playback", help="Playback start latency, stream per answer vs persistent stream")
+    p.add_argument("--runs", type=int, default=20)
+    p.add_argument("--null", action="store_true", help="NullAudioSink instead of the default output device")
+    args = parser.parse_args()
+
+    if args.bench == "playback":
+        bench_playback(args.runs, args.null)
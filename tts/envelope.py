@@ -0,0 +1,100 @@
+import logging
+import threading
+import time
+from collections import deque
+from typing import Callable
+
+import numpy as np
+
+
+def amplitude_envelope(audio: np.ndarray, sample_rate: int, fps: float, kind: str = "mean_abs") -> np.ndarray:
+    """
+    Amplitude of int16 mono audio every 1/fps s, in one vectorized pass (int16 scale, float32).
+    kind is "mean_abs" (mean absolute value) or "rms". The last frame may be shorter.
+    """
+    hop = max(1, int(round(sample_rate / fps)))
+    n = -(-len(audio) // hop)
+    if n == 0:
+        return np.zeros(0, dtype=np.float32)
+    frames = np.zeros(n * hop, dtype=np.float32)
+    frames[:len(audio)] = audio
+    frames = frames.reshape(n, hop)
+    counts = np.full(n, hop, dtype=np.float32)
+    counts[-1] = len(audio) - (n - 1) * hop
+    if kind == "rms":
+        return np.sqrt(np.einsum("ij,ij->i", frames, frames) / counts)
+    if kind != "mean_abs":
+        raise ValueError(f"Unknown envelope kind {kind!r}, expected 'mean_abs' or 'rms'")
+    return np.abs(frames).sum(axis=1) / counts
+
+
+class EnvelopeFeed:
+    """
+    Delivers the amplitude envelope of an answer to an avatar callback, in time with playback.
+
+    `add(audio)` is called when a piece of audio starts being written to the output: its
+    envelope is computed at once and scheduled from the moment that piece starts to sound
+    (right now, or when the audio already queued ends). A timer thread calls callback(value)
+    at each envelope frame, so the callback never runs on the thread writing audio and a slow
+    renderer can't delay playback. `stop()` drops what is left (e.g. barge-in), `close()`
+    lets the values already scheduled play out.
+    """
+
+    def __init__(self, callback: Callable[[float], None], sample_rate: int, fps: float, kind: str = "mean_abs"):
+        self.log = logging.getLogger("TTS")
+        self.callback = callback
+        self.sample_rate = sample_rate
+        self.fps = fps
+        self.kind = kind
+        self.segments: deque = deque() # (start time, envelope)
+        self.end = 0.0 # When the audio scheduled so far ends
+        self.wake = threading.Condition()
+        self.closed = False
+        self.stopped = False
+        self.thread: threading.Thread | None = None
+
+    def add(self, audio: np.ndarray) -> None:
+        env = amplitude_envelope(audio, self.sample_rate, self.fps, self.kind)
+        with self.wake:
+            start = max(time.perf_counter(), self.end)
+            self.end = start + len(audio) / self.sample_rate
+            self.segments.append((start, env))
+            self.wake.notify()
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name="tts-envelope", daemon=True)
+            self.thread.start()
+
+    def run(self) -> None:
+        period = 1.0 / self.fps
+        while True:
+            with self.wake:
+                while not self.segments and not self.closed and not self.stopped:
+                    self.wake.wait()
+                if self.stopped or not self.segments:
+                    return
+                start, env = self.segments.popleft()
+
+            for i, value in enumerate(env):
+                with self.wake:
+                    delay = start + i * period - time.perf_counter()
+                    if delay > 0:
+                        self.wake.wait_for(lambda: self.stopped, timeout=delay)
+                    if self.stopped:
+                        return
+                try:
+                    self.callback(float(value))
+                except Exception as e:
+                    self.log.error(f"Error in the amplitude callback: {e}")
+
+    def close(self) -> None:
+        """ No more audio, the thread ends after the last scheduled value """
+        with self.wake:
+            self.closed = True
+            self.wake.notify()
+
+    def stop(self) -> None:
+        """ Playback cut short, drop the values not delivered yet """
+        with self.wake:
+            self.stopped = True
+            self.segments.clear()
+            self.wake.notify()
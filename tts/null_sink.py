@@ -0,0 +1,33 @@
+import time
+
+
+class NullAudioSink:
+    """
+    Output stream that discards the audio, used instead of PyAudio to run the TTS without a
+    sound card (replays, CI). It implements the calls TTS makes on its stream and records when
+    the first chunk arrived. realtime=True blocks like a sound card would (len / sample rate).
+    """
+
+    def __init__(self, sample_rate: int, realtime: bool = False):
+        self.sample_rate = sample_rate
+        self.realtime = realtime
+        self.first_write: float | None = None
+        self.bytes_written = 0
+
+    def write(self, data: bytes) -> None:
+        if self.first_write is None:
+            self.first_write = time.perf_counter()
+        self.bytes_written += len(data)
+        if self.realtime:
+            time.sleep(len(data) / 2 / self.sample_rate)
+
+    def reset(self) -> None:
+        """ Forget the previous answer, the next write is a new first chunk """
+        self.first_write = None
+        self.bytes_written = 0
+
+    def stop_stream(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
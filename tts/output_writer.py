@@ -0,0 +1,96 @@
+import logging
+import queue
+import threading
+from typing import Callable, Optional
+
+
+class OutputWriter:
+    """
+    Output stream that stays open between answers, fed by a writer thread.
+
+    The stream is opened once by `start()` (so the device-open cost is paid at startup, not at
+    the first syllable of every answer) and closed by `terminate()`. `write()` queues PCM and
+    returns at once; `drain()` blocks until everything queued so far has been written. With
+    keep_warm=True short blocks of silence are written while idle, for devices that suspend
+    or click when their buffer runs dry.
+    """
+
+    def __init__(self, open_stream: Callable, sample_rate: int, keep_warm: bool = False, warm_ms: int = 20, queue_size: int = 64):
+        self.log = logging.getLogger("TTS")
+        self.open_stream = open_stream
+        self.keep_warm = keep_warm
+        self.warm_s = warm_ms / 1000
+        self.silence = bytes(int(sample_rate * self.warm_s) * 2)
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.stream = None
+        self.thread: Optional[threading.Thread] = None
+        self.stop_event = threading.Event()
+
+    def start(self) -> bool:
+        """ Open the stream and start the writer thread, False if the device couldn't be opened """
+        if self.thread is not None:
+            return True
+        try:
+            self.stream = self.open_stream()
+        except Exception as e:
+            self.log.error(f"Error while trying to open the output stream: {e}")
+            return False
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, name="tts-writer", daemon=True)
+        self.thread.start()
+        return True
+
+    def write(self, data: bytes, on_written: Optional[Callable[[], None]] = None, cancel: Optional[threading.Event] = None) -> None:
+        """ Queue PCM bytes, on_written() is called from the writer thread once they are written. Skipped if cancel is set by then """
+        self.queue.put((data, on_written, cancel))
+
+    def drain(self, timeout: Optional[float] = None) -> bool:
+        """ Block until everything queued before this call has been written """
+        if self.thread is None:
+            return True
+        done = threading.Event()
+        self.queue.put(done)
+        return done.wait(timeout)
+
+    def run(self) -> None:
+        timeout = self.warm_s if self.keep_warm else 0.1
+        while not self.stop_event.is_set():
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                if self.keep_warm:
+                    self._write(self.silence)
+                continue
+            if isinstance(item, threading.Event):
+                item.set()
+                continue
+            data, on_written, cancel = item
+            if cancel is not None and cancel.is_set():
+                continue
+            self._write(data)
+            if on_written is not None:
+                on_written()
+
+    def _write(self, data: bytes) -> None:
+        try:
+            self.stream.write(data)
+        except OSError as e:
+            self.log.error(f"Error while writing the audio stream: {e}")
+
+    def terminate(self) -> None:
+        """ Stop the writer thread and close the stream, pending audio is dropped """
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=2.0)
+            self.thread = None
+        while True: # Release anyone waiting on drain()
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, threading.Event):
+                item.set()
+        if self.stream is not None:
+            self.stream.stop_stream()
+            self.stream.close()
+            self.stream = None
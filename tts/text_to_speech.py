@@ -1,6 +1,9 @@
 # tts/text_to_speech.py
 import torch
 import io
+import queue
+import threading
+import time
 import wave
 import numpy as np
 import pyaudio
@@ -8,6 +11,12 @@ import logging
 from pathlib import Path
 from piper.voice import PiperVoice, SynthesisConfig
 
+from tts.audio_bank import AudioBank
+from tts.audio_cache import AudioCache
+from tts.envelope import EnvelopeFeed
+from tts.output_writer import OutputWriter
+from utils.metrics import METRICS
+
 # Configuration
 from pathlib import Path
 import yaml
@@ -27,10 +36,47 @@ speed = cfg.get("tts", {}).get("speed", 1.0)
 path_to_save = cfg.get("tts", {}).get("path_to_save", "tts/audios")
 name_of_outs = cfg.get("tts", {}).get("name_of_outs", "test")
 save_wav = cfg.get("tts", {}).get("save_wav", False)
+streaming = cfg.get("tts", {}).get("streaming", True)
+stream_queue_size = cfg.get("tts", {}).get("stream_queue_size", 4)
+audio_cache_size = cfg.get("tts", {}).get("audio_cache_size", 64)
+audio_cache_dir = cfg.get("tts", {}).get("audio_cache_dir", "~/.cache/agents_manager/tts_audio")
+audio_cache_max_disk_mb = cfg.get("tts", {}).get("audio_cache_max_disk_mb", 200)
+audio_bank_path = cfg.get("tts", {}).get("audio_bank_path", "config/data/general_QA.audiobank")
+persistent_stream = cfg.get("tts", {}).get("persistent_stream", True)
+keep_warm = cfg.get("tts", {}).get("keep_warm", False)
+keep_warm_ms = cfg.get("tts", {}).get("keep_warm_ms", 20)
+envelope_fps = cfg.get("tts", {}).get("envelope_fps", 30)
+envelope_kind = cfg.get("tts", {}).get("envelope_kind", "mean_abs")
+
+
+def synthesis_config() -> SynthesisConfig:
+    """ Piper settings used for every answer (also by the audio bank build) """
+    return SynthesisConfig(
+        volume = volume,  # half as loud
+        length_scale = speed,  # twice as slow
+        noise_scale = 1.0,  # more audio variation
+        noise_w_scale = 1.0,  # more speaking variation
+        normalize_audio=False, # use raw audio from voice
+    )
+
+
+def voice_identity(model_path: str) -> dict:
+    """ What identifies a voice model in audio keys: replacing the file changes it """
+    stat = Path(model_path).stat()
+    return {"model": Path(model_path).name, "size": stat.st_size, "mtime": stat.st_mtime_ns}
+
+
+def mark_first_audio() -> None:
+    METRICS.mark("first_audio")
+
+
+def audio_key(text: str, voice_id: dict, syn_config: SynthesisConfig) -> str:
+    """ Key of the audio of text in the cache and the audio bank """
+    return AudioCache.key(text, voice_id, {**vars(syn_config), "sample_rate": sample_rate})
 
 
 class TTS:
-    def __init__(self, model_path:str, model_path_conf:str):
+    def __init__(self, model_path:str, model_path_conf:str, sink=None, persistent:bool=persistent_stream):
         self.log = logging.getLogger("TTS")
         self.log.info("Loading Whisper TTS model...")
         self.log = logging.getLogger("TTS")
@@ -39,28 +85,61 @@ class TTS:
         self.count_of_audios = 0
         self.out_path = Path(path_to_save) / Path(name_of_outs) / Path(f"{name_of_outs}_{self.count_of_audios}.wav")
         
-        self.syn_config = SynthesisConfig(
-            volume = volume,  # half as loud
-            length_scale = speed,  # twice as slow
-            noise_scale = 1.0,  # more audio variation
-            noise_w_scale = 1.0,  # more speaking variation
-            normalize_audio=False, # use raw audio from voice
-        )
+        self.syn_config = synthesis_config()
+
+        # Synthesized audio is cached by text + voice + synthesis settings
+        self.voice_id = voice_identity(model_path)
+        self.cache = AudioCache(audio_cache_size, audio_cache_dir, audio_cache_max_disk_mb) if audio_cache_size > 0 or audio_cache_dir else None
+        # Pre-rendered knowledge base answers (python -m tts.audio_bank)
+        self.bank = AudioBank.open(BASE_DIR / audio_bank_path) if audio_bank_path else None
+
+        # Optional output replacing the sound card (e.g. tts.null_sink.NullAudioSink)
+        self.sink = sink
 
         try:
-            self.pa = pyaudio.PyAudio()
+            self.pa = pyaudio.PyAudio() if sink is None else None
         except Exception as e:
             self.log.error(f"Error while trying to start PyAudio: {e}")
             self.pa = None
 
         self.stream = None
+
+        # Output opened once here and written by a thread, instead of one stream per answer
+        self.writer = OutputWriter(self.open_output, self.sample_rate, keep_warm, keep_warm_ms) if persistent else None
+        if self.writer is not None:
+            self.start_stream()
         self.log.info("Text To Speech initialized")
 
     def synthesize(self, text: str):
         """Convert Text to Speech using Piper, return mono audio float32 [-1,1]"""
         if not text:
             return None
-        
+        return self.synthesize_int16(text).astype(np.float32) / 32768.0
+
+    def cache_key(self, text: str) -> str:
+        return audio_key(text, self.voice_id, self.syn_config)
+
+    def stored_audio(self, key: str) -> np.ndarray | None:
+        """ Audio already rendered for key: a slice of the audio bank mmap, or the audio cache """
+        audio = self.bank.get(key) if self.bank is not None else None
+        if audio is None and self.cache is not None:
+            audio = self.cache.get(key)
+        return audio
+
+    def synthesize_int16(self, text: str) -> np.ndarray:
+        """ int16 PCM of text, taken from the audio bank or cache when it was already synthesized (unless save_wav is set) """
+        key = self.cache_key(text)
+        stored = self.stored_audio(key) if not save_wav else None # Every answer has to be synthesized to be saved
+        if stored is not None:
+            return stored
+
+        with METRICS.span("tts.synthesize"):
+            pcm_i16 = self._synthesize(text)
+        if self.cache is not None:
+            self.cache.put(key, pcm_i16)
+        return pcm_i16
+
+    def _synthesize(self, text: str) -> np.ndarray:
         if save_wav:
             self.out_path.parent.mkdir(parents=True, exist_ok=True)
             with wave.open(str(self.out_path), "wb") as wav_file:
@@ -73,19 +152,18 @@ class TTS:
             # Piper setea params internamente; solo pásale el writer
             self.voice.synthesize_wav(text,w, syn_config=self.syn_config)
 
-        # Lee el WAV del buffer y devuélvelo como float32 normalizado
+        # Lee el WAV del buffer y devuelve el PCM int16
         mem.seek(0)
         with wave.open(mem, "rb") as r:
             frames = r.readframes(r.getnframes())
-            pcm_i16 = np.frombuffer(frames, dtype=np.int16)
-        audio_f32 = (pcm_i16.astype(np.float32) / 32768.0)
-        return audio_f32
+            return np.frombuffer(frames, dtype=np.int16)
 
-    def play_audio_with_amplitude(self, audio_data, amplitude_callback=None):
+    def play_audio_with_amplitude(self, audio_data, amplitude_callback=None, cancel: threading.Event | None = None):
         """
-        Plays the given float32 numpy array (single-channel).
-        If amplitude_callback is provided, pass the amplitude
-        of each chunk to it for mouth animation, etc.
+        Plays the given float32 numpy array (single-channel), int16 arrays are played as they are.
+        If amplitude_callback is provided, pass the amplitude envelope (envelope_fps values
+        per second) to it for mouth animation, etc., in time with the audio.
+        Setting the cancel token stops the playback within one chunk (barge-in).
         """
         if audio_data is None or len(audio_data) == 0:
             return
@@ -102,53 +180,183 @@ class TTS:
             self.log.error("Audio streaming service couldn't be started")
             return
 
-        # Convert float32 [-1..1] to int16
-        audio_int16 = np.clip(audio_data * 32767.0, -32767.0, 32767.0).astype(np.int16)
+        start = time.perf_counter()
+        envelope = self.envelope_feed(amplitude_callback)
+        self.write_audio(audio_data, envelope, cancel)
 
+        self.end_playback()
+        self.close_envelope(envelope, cancel)
+        METRICS.observe("tts.playback", time.perf_counter() - start)
+        METRICS.finish()
+        return True
+
+    def write_audio(self, audio_data, envelope: EnvelopeFeed | None = None, cancel: threading.Event | None = None) -> bool:
+        """
+        Write float32 [-1..1] (or int16) audio to the open stream in 4096-sample chunks, False if
+        the stream failed or cancel was set (checked between chunks). With the persistent stream
+        the chunks are queued to the writer thread, which skips them once cancel is set. The
+        audio is scheduled on envelope (if any) as it starts to be written.
+        """
+        # Convert float32 [-1..1] to int16
+        if audio_data.dtype == np.int16:
+            audio_int16 = audio_data
+        else:
+            audio_int16 = np.clip(audio_data * 32767.0, -32767.0, 32767.0).astype(np.int16)
 
         chunk_size = 4096
         idx = 0
         total_frames = len(audio_int16)
+        if envelope is not None:
+            envelope.add(audio_int16)
 
         while idx < total_frames:
             chunk_end = min(idx + chunk_size, total_frames)
             chunk = audio_int16[idx:chunk_end]
+            if cancel is not None and cancel.is_set():
+                return False
+            if self.writer is not None:
+                self.writer.write(chunk.tobytes(), mark_first_audio if idx == 0 else None, cancel)
+                idx += chunk_size
+                continue
             try:
                 self.stream.write(chunk.tobytes())
+                if idx == 0:
+                    METRICS.mark("first_audio")
             except OSError as e:
                 self.log.error(f"Error while writing the audio stream: {e}")
-                break
-
-            if amplitude_callback:
-                # amplitude = mean absolute value
-                amplitude = np.abs(chunk.astype(np.float32)).mean()
-                amplitude_callback(amplitude)
+                if envelope is not None:
+                    envelope.stop()
+                return False
 
             idx += chunk_size
+        return True
 
-        self.stop_tts()
+    def envelope_feed(self, amplitude_callback=None) -> EnvelopeFeed | None:
+        """ Amplitude envelope delivery for one answer, None without a callback """
+        if amplitude_callback is None:
+            return None
+        return EnvelopeFeed(amplitude_callback, self.sample_rate, envelope_fps, envelope_kind)
+
+    @staticmethod
+    def close_envelope(envelope: EnvelopeFeed | None, cancel: threading.Event | None = None) -> None:
+        """ End of an answer: the envelope plays out, or stops right away if the answer was cut short """
+        if envelope is None:
+            return
+        if cancel is not None and cancel.is_set():
+            envelope.stop()
+        else:
+            envelope.close()
+
+    def speak(self, text: str, amplitude_callback=None, cancel: threading.Event | None = None):
+        """
+        Say text: streamed sentence by sentence when `streaming` is set, else synthesized first and
+        then played. Setting the cancel token cuts the answer short.
+        """
+        if streaming and not save_wav:
+            return self.speak_streaming(text, amplitude_callback, cancel)
+        return self.play_audio_with_amplitude(self.synthesize_int16(text) if text else None, amplitude_callback, cancel)
+
+    def speak_streaming(self, text: str, amplitude_callback=None, cancel: threading.Event | None = None):
+        """
+        Synthesize text sentence by sentence on a worker thread (Piper yields one audio chunk per
+        sentence) while this thread plays the chunks already done, so the first sentence is heard
+        while the rest of the answer is still being synthesized. Stored answers are played directly.
+        """
+        if not text:
+            return
+
+        key = self.cache_key(text)
+        stored = self.stored_audio(key)
+        if stored is not None:
+            return self.play_audio_with_amplitude(stored, amplitude_callback, cancel)
+
+        self.start_stream()
+        if self.stream is None:
+            self.log.error("Audio streaming service couldn't be started")
+            return
+
+        chunks: queue.Queue = queue.Queue(maxsize=stream_queue_size)
+        stop = threading.Event()
+        DONE = None
+
+        def synthesize_worker():
+            parts = []
+            try:
+                with METRICS.span("tts.synthesize"):
+                    for chunk in self.voice.synthesize(text, syn_config=self.syn_config):
+                        if stop.is_set() or (cancel is not None and cancel.is_set()):
+                            return
+                        audio = chunk.audio_int16_array
+                        parts.append(audio)
+                        chunks.put(audio)
+                if self.cache is not None and parts:
+                    self.cache.put(key, np.concatenate(parts))
+            except Exception as e:
+                self.log.error(f"Error while synthesizing: {e}")
+            finally:
+                chunks.put(DONE)
+
+        worker = threading.Thread(target=synthesize_worker, name="tts-synth", daemon=True)
+        worker.start()
+
+        start = time.perf_counter()
+        envelope = self.envelope_feed(amplitude_callback)
+        while (audio := chunks.get()) is not DONE:
+            if not self.write_audio(audio, envelope, cancel):
+                stop.set()
+                while chunks.get() is not DONE: # Unblock the worker
+                    pass
+                break
+
+        worker.join()
+        self.end_playback()
+        self.close_envelope(envelope, cancel)
+        METRICS.observe("tts.playback", time.perf_counter() - start)
+        METRICS.finish()
         return True
 
-    def start_stream(self):
-        """ Start the audio stream if not already started."""
+    def open_output(self):
+        """ New output stream on the sound card, or the sink when there is one """
+        if self.sink is not None:
+            return self.sink
         if self.pa is None:
             self.pa = pyaudio.PyAudio()
+        return self.pa.open(format=pyaudio.paInt16, channels=1, rate=self.sample_rate, output=True)
+
+    def start_stream(self):
+        """ Start the audio stream if not already started."""
+        if self.writer is not None:
+            self.stream = self.writer.stream if self.writer.start() else None
+            return
 
         if self.stream is None:
             try:
-                self.stream = self.pa.open(format=pyaudio.paInt16, channels=1, rate=self.sample_rate, output=True)
+                self.stream = self.open_output()
             except Exception as e:
                 self.log.error(f"Error while trying to open the output stream: {e}")
 
+    def end_playback(self):
+        """ End of an answer: wait for the writer to play it out, or close the per-answer stream """
+        if self.writer is not None:
+            self.writer.drain()
+        else:
+            self.stop_tts()
+
     def stop_tts(self):
-        """Stop the stream"""
+        """Stop the per-answer stream, the persistent one stays open until terminate()"""
+        if self.writer is not None:
+            return
 
         if self.stream is not None:
             self.stream.stop_stream()
             self.stream.close()
             self.stream = None
+
     def terminate(self):
         """ Call this when shutting down the whole app"""
+        if self.writer is not None:
+            self.writer.terminate()
+            self.stream = None
         self.stop_tts()
         if self.pa is not None:
             self.pa.terminate()
@@ -180,8 +388,7 @@ if "__main__" == __name__:
         print("Este es el script de prueba del Text to Speech - Presione Ctrl+C para salir\n")
         while True:
             text = input("Escribe algo: ")
-            get_audio = tts.synthesize(text)
-            tts.play_audio_with_amplitude(get_audio)
+            tts.speak(text)
 
     except KeyboardInterrupt:
         tts.terminate()
@@ -0,0 +1,183 @@
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+# Configuration
+import yaml
+
+BASE_DIR = Path(__file__).parent.parent
+SETTINGS = BASE_DIR / "config" / "settings.yml"
+
+with SETTINGS.open("r", encoding="utf-8") as f:
+    cfg = yaml.safe_load(f) or {}
+
+metrics_enabled = cfg.get("metrics", {}).get("enabled", False)
+jsonl_path = cfg.get("metrics", {}).get("jsonl_path", "")
+prometheus_path = cfg.get("metrics", {}).get("prometheus_path", "")
+
+# Seconds, from a fuzzy lookup (ms) to a whole interaction (s)
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Events of one interaction, in order, and the stage that ends at each of them
+EVENTS = ["wake_detected", "buffer_drained", "transcribed", "lookup_done", "first_audio"]
+STAGES = {"buffer_drained": "listen", "transcribed": "stt", "lookup_done": "lookup", "first_audio": "tts_first_audio"}
+
+NULL_SPAN = nullcontext()
+
+
+class Histogram:
+    """ Cumulative-bucket histogram (Prometheus style) of durations in seconds """
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) # Last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """ Upper bound of the bucket holding quantile q, capped at the max seen """
+        if not self.count:
+            return 0.0
+        rank, seen = q * self.count, 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                return min(self.buckets[i], self.max) if i < len(self.buckets) else self.max
+        return self.max
+
+    def stats(self) -> Dict[str, Any]:
+        mean = self.sum / self.count if self.count else 0.0
+        return {"count": self.count, "mean_ms": round(mean * 1000, 2), "p50_ms": round(self.quantile(0.5) * 1000, 2),
+                "p95_ms": round(self.quantile(0.95) * 1000, 2), "max_ms": round(self.max * 1000, 2)}
+
+
+class Metrics:
+    """
+    Per-interaction latency of the agent.
+
+    Components call `mark(event)` at the points of EVENTS (wake detected ... first audio out)
+    and wrap their work in `span(name)`. Every span and every stage between two events goes
+    to a histogram; `finish()` closes the interaction, appends it as a JSON line to jsonl_path
+    and rewrites the Prometheus text file. When disabled every call returns right away.
+    """
+
+    def __init__(self, enabled: bool = metrics_enabled, jsonl: str = jsonl_path, prometheus: str = prometheus_path):
+        self.log = logging.getLogger("System")
+        self.enabled = enabled
+        self.jsonl = Path(jsonl) if jsonl else None
+        self.prometheus_file = Path(prometheus) if prometheus else None
+        self.lock = threading.Lock()
+        self.histograms: Dict[str, Histogram] = {}
+        # Event -> time.perf_counter() of the open interaction (monotonic, immune to clock steps),
+        # plus the wall-clock time it started at, only used to timestamp the exported line
+        self.current: Optional[Dict[str, float]] = None
+        self.started_at = 0.0
+        self.interactions = 0
+
+    def observe(self, name: str, seconds: float) -> None:
+        if not self.enabled:
+            return
+        with self.lock:
+            self.histograms.setdefault(name, Histogram()).observe(seconds)
+
+    def span(self, name: str):
+        """ Context manager timing its block into histogram `name` """
+        return self._span(name) if self.enabled else NULL_SPAN
+
+    @contextmanager
+    def _span(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def mark(self, event: str) -> None:
+        """ Timestamp an event of the interaction, wake_detected opens a new one """
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        if event == "wake_detected":
+            self.finish() # A previous interaction that never reached the audio
+            with self.lock:
+                self.current = {event: now}
+                self.started_at = time.time()
+            return
+        with self.lock:
+            if self.current is None or event in self.current:
+                return
+            self.current[event] = now
+            prev = EVENTS[EVENTS.index(event) - 1] if event in STAGES else None
+            if prev in self.current:
+                self.histograms.setdefault(STAGES[event], Histogram()).observe(now - self.current[prev])
+
+    def finish(self) -> None:
+        """ Close the open interaction and export it """
+        if not self.enabled:
+            return
+        with self.lock:
+            record, self.current = self.current, None
+            if record is None:
+                return
+            started_at = self.started_at
+            self.interactions += 1
+            if "first_audio" in record:
+                self.histograms.setdefault("interaction", Histogram()).observe(record["first_audio"] - record["wake_detected"])
+            prometheus = self.prometheus() if self.prometheus_file else None
+        try:
+            if self.jsonl is not None:
+                self.jsonl.parent.mkdir(parents=True, exist_ok=True)
+                with self.jsonl.open("a", encoding="utf-8") as f:
+                    # Event times as wall clock: start time + monotonic offsets
+                    t0 = record["wake_detected"]
+                    events = {e: round(started_at + t - t0, 6) for e, t in record.items()}
+                    f.write(json.dumps({"time": started_at, "events": events, "stages_ms": self.stage_ms(record)}) + "\n")
+            if prometheus is not None:
+                tmp = self.prometheus_file.with_suffix(self.prometheus_file.suffix + ".tmp")
+                tmp.write_text(prometheus, encoding="utf-8")
+                os.replace(tmp, self.prometheus_file)
+        except OSError as e:
+            self.log.error(f"Error while exporting metrics: {e}")
+
+    @staticmethod
+    def stage_ms(record: Dict[str, float]) -> Dict[str, float]:
+        out = {}
+        for prev, event in zip(EVENTS, EVENTS[1:]):
+            if prev in record and event in record:
+                out[STAGES[event]] = round((record[event] - record[prev]) * 1000, 2)
+        return out
+
+    def snapshot(self) -> Dict[str, Any]:
+        """ In-process view: stats of every histogram """
+        with self.lock:
+            return {"interactions": self.interactions, "histograms": {k: h.stats() for k, h in self.histograms.items()}}
+
+    def prometheus(self) -> str:
+        """ Prometheus text exposition of every histogram (call with the lock held or accept a racy read) """
+        lines: List[str] = ["# HELP octybot_latency_seconds Latency of agent stages and spans",
+                            "# TYPE octybot_latency_seconds histogram"]
+        for name, h in sorted(self.histograms.items()):
+            seen = 0
+            for le, c in zip(list(h.buckets) + ["+Inf"], h.counts):
+                seen += c
+                lines.append(f'octybot_latency_seconds_bucket{{stage="{name}",le="{le}"}} {seen}')
+            lines.append(f'octybot_latency_seconds_sum{{stage="{name}"}} {h.sum:.6f}')
+            lines.append(f'octybot_latency_seconds_count{{stage="{name}"}} {h.count}')
+        lines.append(f"octybot_interactions_total {self.interactions}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
@@ -0,0 +1,145 @@
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+
+class StageQueue:
+    """
+    Bounded FIFO between two pipeline stages.
+
+    policy="block": put waits while the queue is full (backpressure on the producer).
+    policy="drop_oldest": put never waits, the oldest item is discarded instead. This is
+    what the capture stage uses, so reading the microphone is never blocked by a slow consumer.
+    """
+
+    def __init__(self, name: str, maxsize: int, policy: str = "block"):
+        if policy not in ("block", "drop_oldest"):
+            raise ValueError(f"Unknown queue policy: {policy}")
+        self.name = name
+        self.maxsize = max(1, maxsize)
+        self.policy = policy
+        self.items: deque = deque()
+        self.cond = threading.Condition()
+        self.closed = False
+        self.max_depth = 0
+        self.dropped = 0
+        self.total = 0
+
+    def put(self, item: Any, timeout: Optional[float] = None) -> bool:
+        """ Enqueue item, returns False if the queue was closed (or the timeout expired) before it fit """
+        with self.cond:
+            if self.policy == "drop_oldest":
+                if len(self.items) >= self.maxsize:
+                    self.items.popleft()
+                    self.dropped += 1
+            else:
+                deadline = None if timeout is None else time.monotonic() + timeout
+                while len(self.items) >= self.maxsize and not self.closed:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    self.cond.wait(remaining)
+            if self.closed:
+                return False
+            self.items.append(item)
+            self.total += 1
+            self.max_depth = max(self.max_depth, len(self.items))
+            self.cond.notify_all()
+            return True
+
+    def get(self, timeout: Optional[float] = None) -> Any:
+        """ Dequeue the next item, or None when the timeout expires or the queue is closed and empty """
+        with self.cond:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while not self.items and not self.closed:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self.cond.wait(remaining)
+            if not self.items:
+                return None
+            item = self.items.popleft()
+            self.cond.notify_all()
+            return item
+
+    def close(self) -> None:
+        """ Wake up every waiting producer/consumer, nothing else is accepted """
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def stats(self) -> Dict[str, Any]:
+        with self.cond:
+            return {"depth": len(self.items), "max_depth": self.max_depth, "maxsize": self.maxsize,
+                    "total": self.total, "dropped": self.dropped}
+
+
+class Stage:
+    """
+    One pipeline stage running in its own daemon thread.
+
+    It takes items from `inbox` (or calls `fn()` repeatedly when there is no inbox, for sources),
+    passes them to `fn` and forwards every non-None result to `outbox`. The time spent in `fn`
+    is recorded so slow stages are visible in `stats()`.
+    """
+
+    def __init__(self, name: str, fn: Callable, inbox: Optional[StageQueue] = None, outbox: Optional[StageQueue] = None):
+        self.name = name
+        self.fn = fn
+        self.inbox = inbox
+        self.outbox = outbox
+        self.log = logging.getLogger("System")
+        self.stop_event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+        self.count = 0
+        self.total_s = 0.0
+        self.last_s = 0.0
+        self.max_s = 0.0
+        self.errors = 0
+
+    def start(self) -> None:
+        self.thread = threading.Thread(target=self.run, name=f"stage-{self.name}", daemon=True)
+        self.thread.start()
+
+    def run(self) -> None:
+        while not self.stop_event.is_set():
+            if self.inbox is not None:
+                item = self.inbox.get(timeout=0.1)
+                if item is None:
+                    if self.inbox.closed:
+                        break
+                    continue
+                args = (item,)
+            else:
+                args = ()
+
+            start = time.perf_counter()
+            try:
+                out = self.fn(*args)
+            except Exception as e:
+                self.errors += 1
+                self.log.error(f"Error in pipeline stage '{self.name}': {e}")
+                continue
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.total_s += elapsed
+            self.last_s = elapsed
+            self.max_s = max(self.max_s, elapsed)
+
+            if out is not None and self.outbox is not None:
+                self.outbox.put(out)
+
+    def stop(self, timeout: float = 2.0) -> None:
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        mean = self.total_s / self.count if self.count else 0.0
+        return {"count": self.count, "errors": self.errors, "last_ms": round(self.last_s * 1000, 2),
+                "mean_ms": round(mean * 1000, 2), "max_ms": round(self.max_s * 1000, 2)}